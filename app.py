@@ -1,6 +1,7 @@
+from config import get_config
 from app import create_app
 
-app = create_app()
+app = create_app(get_config())
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
@@ -1,21 +1,67 @@
+from functools import partial
+from importlib import import_module
 from flask import Flask
+from sqlalchemy import event
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
+from flask_migrate import Migrate
 from config import Config
+from app.cache import Cache
+from app.metrics import Metrics
+from app.replicas import RoutingSession, replicas
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
+migrate = Migrate()
+cache = Cache()
+metrics = Metrics()
+
+def set_sqlite_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
-    # Initialize extensions
+    # Swap in the configured JSON provider, if any
+    if app.config.get('JSON_PROVIDER'):
+        module_name, _, class_name = app.config['JSON_PROVIDER'].partition(':')
+        app.json = getattr(import_module(module_name), class_name)(app)
+
+    # Initialize extensions; the replica binds must be configured before db creates its engines
+    replicas.init_app(app)
     db.init_app(app)
+    migrate.init_app(app, db)
+    if app.config.get('SQLITE_PRAGMAS'):
+        with app.app_context():
+            for engine in db.engines.values():
+                if engine.dialect.name == 'sqlite':
+                    event.listen(engine, 'connect', partial(set_sqlite_pragmas, app.config['SQLITE_PRAGMAS']))
     jwt.init_app(app)
+    cache.init_app(app)
+    metrics.init_app(app)
     CORS(app)
 
+    # Imported here because they depend on the models
+    from app.account_numbers import account_numbers
+    from app.posting import posting
+    from app.bulk_import import import_cli
+    from app.archive import archive_cli
+    from app.idempotency import idempotency
+    from app.reconcile import reconcile_cli
+    from app.balance_shards import balance_shards_cli
+    account_numbers.init_app(app)
+    posting.init_app(app)
+    idempotency.init_app(app)
+    app.cli.add_command(import_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(reconcile_cli)
+    app.cli.add_command(balance_shards_cli)
+
     # Register blueprints
     from app.api.users import bp as users_bp
     from app.api.accounts import bp as accounts_bp
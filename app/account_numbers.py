@@ -0,0 +1,87 @@
+"""
+Account number allocation without probe queries
+
+Serials are reserved in blocks from a single counter row with one atomic
+UPDATE ... RETURNING, committed on its own connection, so every process
+owns a disjoint range and hands out numbers from memory. An account
+number is the zero-padded 10-digit serial followed by a Luhn check digit.
+Legacy random numbers are 10 digits long, so the two can never collide.
+"""
+import os
+import threading
+
+from flask import current_app
+from sqlalchemy import update, insert
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import AccountNumberBlock
+
+SERIAL_DIGITS = 10
+
+def luhn_check_digit(digits):
+    """Check digit that makes digits + check pass the Luhn test"""
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        n = int(digit)
+        if i % 2 == 0:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return str((10 - total % 10) % 10)
+
+def is_valid_account_number(number):
+    return (len(number) == SERIAL_DIGITS + 1 and number.isdigit()
+            and luhn_check_digit(number[:-1]) == number[-1])
+
+def format_account_number(serial):
+    digits = f'{serial:0{SERIAL_DIGITS}d}'
+    return digits + luhn_check_digit(digits)
+
+class AccountNumberAllocator:
+    """Flask extension handing out account numbers from per-process blocks"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ACCOUNT_NUMBER_BLOCK_SIZE', 100)
+        app.extensions['account_numbers'] = {
+            'lock': threading.Lock(), 'pid': None, 'next': 0, 'end': 0
+        }
+
+    def _reserve_block(self, engine, size):
+        """Claim [start, end) from the counter row; returns (start, end)"""
+        while True:
+            with engine.begin() as conn:
+                end = conn.execute(
+                    update(AccountNumberBlock)
+                    .where(AccountNumberBlock.id == 1)
+                    .values(next_serial=AccountNumberBlock.next_serial + size)
+                    .returning(AccountNumberBlock.next_serial)
+                ).scalar()
+                if end is not None:
+                    return end - size, end
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(AccountNumberBlock).values(id=1, next_serial=1))
+            except IntegrityError:
+                # Another process created the counter row first
+                pass
+
+    def allocate(self):
+        """Return a fresh account number for the current app"""
+        state = current_app.extensions['account_numbers']
+        with state['lock']:
+            # A forked worker must not reuse its parent's block
+            if state['pid'] != os.getpid() or state['next'] >= state['end']:
+                state['next'], state['end'] = self._reserve_block(
+                    db.engine, current_app.config['ACCOUNT_NUMBER_BLOCK_SIZE'])
+                state['pid'] = os.getpid()
+            serial = state['next']
+            state['next'] += 1
+        return format_account_number(serial)
+
+account_numbers = AccountNumberAllocator()
@@ -1,56 +1,79 @@
-from flask import Blueprint, request, jsonify
+import hashlib
+
+from flask import Blueprint, request, jsonify, abort
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Account, User
-from app import db
-import random
-import string
+from app.models import Account, BalanceSnapshot
+from app.idempotency import idempotent
+from app.api.auth import check_account_owner
+from app.api.etags import conditional_response
+from app.api import ledger
+from app.serializers import ACCOUNT, TRANSACTION
+from app import db, cache
+from app.cache import account_key, accounts_key
+from app.account_numbers import account_numbers
+from app.archive import transaction_source
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select
 
 bp = Blueprint('accounts', __name__)
 
-def generate_account_number():
-    """Generate a random 10-digit account number"""
-    return ''.join(random.choices(string.digits, k=10))
-
-def check_account_owner(account_id, user_id):
-    """Check if the account belongs to the user"""
-    account = Account.query.get_or_404(account_id)
-    if account.user_id != user_id:
-        return False, account
-    return True, account
+def account_etag(account_id, version):
+    return f'{account_id}.{version}'
 
 @bp.route('', methods=['GET'])
 @jwt_required()
 def get_accounts():
     current_user_id = get_jwt_identity()
-    accounts = Account.query.filter_by(user_id=current_user_id).all()
-    
-    return jsonify([{
-        'id': account.id,
-        'account_number': account.account_number,
-        'account_type': account.account_type,
-        'balance': account.balance,
-        'created_at': account.created_at.isoformat()
-    } for account in accounts])
+    # The versions always come from the database: another worker may have
+    # changed an account without reaching this worker's cache. Revalidation
+    # only needs the (user_id) index plus shard keys.
+    versions = [tuple(row) for row in db.session.query(Account.id, ledger.total_version()).filter(
+        Account.user_id == int(current_user_id)).order_by(Account.id)]
+    etag = hashlib.sha1(repr(versions).encode()).hexdigest()
+    
+    def current(accounts):
+        return sorted((a['id'], a['version']) for a in accounts) == versions
+    
+    def build():
+        return jsonify(cache.get_or_set(accounts_key(current_user_id), lambda: ACCOUNT.many(
+            db.session.query(*ACCOUNT.columns).filter(Account.user_id == int(current_user_id))
+        ), valid=current))
+    
+    return conditional_response(etag, build)
 
 @bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
 def get_account(id):
     current_user_id = get_jwt_identity()
-    is_owner, account = check_account_owner(id, current_user_id)
     
-    if not is_owner:
+    def load():
+        row = db.session.query(Account.user_id, *ACCOUNT.columns).filter(Account.id == id).first()
+        if row is None:
+            return None
+        return {'user_id': row[0], 'account': ACCOUNT.from_row(row[1:])}
+    
+    # One primary key lookup checks ownership and gives the current version,
+    # which a cached body must match (it may predate another worker's write)
+    row = db.session.query(Account.user_id, ledger.total_version()).filter(Account.id == id).first()
+    if row is None:
+        abort(404)
+    user_id, version = row
+    
+    if user_id != int(current_user_id):
         return jsonify({'error': 'Unauthorized access'}), 403
     
-    return jsonify({
-        'id': account.id,
-        'account_number': account.account_number,
-        'account_type': account.account_type,
-        'balance': account.balance,
-        'created_at': account.created_at.isoformat()
-    })
+    def build():
+        account = cache.get_or_set(account_key(id), load,
+                                   valid=lambda cached: cached['account']['version'] == version)
+        if account is None:
+            abort(404)
+        return jsonify(account['account'])
+    
+    return conditional_response(account_etag(id, version), build)
 
 @bp.route('', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_account():
     current_user_id = get_jwt_identity()
     data = request.get_json()
@@ -63,14 +86,8 @@ def create_account():
     if data['account_type'].lower() not in valid_types:
         return jsonify({'error': f'Account type must be one of: {", ".join(valid_types)}'}), 400
     
-    # Generate unique account number
-    while True:
-        account_number = generate_account_number()
-        if not Account.query.filter_by(account_number=account_number).first():
-            break
-    
     account = Account(
-        account_number=account_number,
+        account_number=account_numbers.allocate(),
         account_type=data['account_type'].lower(),
         user_id=current_user_id,
         balance=0.0
@@ -78,16 +95,11 @@ def create_account():
     
     db.session.add(account)
     db.session.commit()
+    cache.delete(accounts_key(current_user_id))
     
     return jsonify({
         'message': 'Account created successfully',
-        'account': {
-            'id': account.id,
-            'account_number': account.account_number,
-            'account_type': account.account_type,
-            'balance': account.balance,
-            'created_at': account.created_at.isoformat()
-        }
+        'account': ACCOUNT.from_object(account)
     }), 201
 
 @bp.route('/<int:id>', methods=['PUT'])
@@ -105,19 +117,19 @@ def update_account(id):
         valid_types = ['savings', 'checking']
         if data['account_type'].lower() not in valid_types:
             return jsonify({'error': f'Account type must be one of: {", ".join(valid_types)}'}), 400
-        account.account_type = data['account_type'].lower()
+        account_type = data['account_type'].lower()
+        if account_type != account.account_type:
+            account.account_type = account_type
+            account.version = Account.version + 1
     
     db.session.commit()
+    cache.invalidate_accounts({account.id: account.user_id})
     
+    # Read back rather than from the object, so hot accounts' shards are included
+    row = db.session.query(*ACCOUNT.columns).filter(Account.id == id).one()
     return jsonify({
         'message': 'Account updated successfully',
-        'account': {
-            'id': account.id,
-            'account_number': account.account_number,
-            'account_type': account.account_type,
-            'balance': account.balance,
-            'created_at': account.created_at.isoformat()
-        }
+        'account': ACCOUNT.from_row(row)
     })
 
 @bp.route('/<int:id>', methods=['DELETE'])
@@ -129,10 +141,68 @@ def delete_account(id):
     if not is_owner:
         return jsonify({'error': 'Unauthorized access'}), 403
     
-    if account.balance > 0:
+    if db.session.scalar(select(ledger.total_balance()).where(Account.id == id)) > 0:
         return jsonify({'error': 'Cannot delete account with positive balance'}), 400
     
+    account_id, user_id = account.id, account.user_id
     db.session.delete(account)
     db.session.commit()
+    cache.invalidate_accounts({account_id: user_id})
     
     return jsonify({'message': 'Account deleted successfully'})
+
+@bp.route('/<int:id>/statement', methods=['GET'])
+@jwt_required()
+def get_account_statement(id):
+    current_user_id = get_jwt_identity()
+    is_owner, account = check_account_owner(id, current_user_id)
+    
+    if not is_owner:
+        return jsonify({'error': 'Unauthorized access'}), 403
+    
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else account.created_at.date()
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.utcnow().date()
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, expected YYYY-MM-DD'}), 400
+    
+    if start > end:
+        return jsonify({'error': 'from must not be after to'}), 400
+    
+    range_start = datetime.combine(start, time.min)
+    if account.balance_shards:
+        # Hot accounts have no snapshots
+        opening_balance = ledger.balance_before(id, range_start)
+    else:
+        # Opening balance is the closing balance of the last snapshot before the range
+        opening_balance = db.session.query(BalanceSnapshot.closing_balance).filter(
+            BalanceSnapshot.account_id == id,
+            BalanceSnapshot.day < start
+        ).order_by(BalanceSnapshot.day.desc()).limit(1).scalar() or 0.0
+    
+    source = transaction_source(range_start)
+    transactions = db.session.query(*TRANSACTION.columns_for(source)).filter(
+        (source.from_account_id == id) | (source.to_account_id == id),
+        source.status == 'completed',
+        source.timestamp >= range_start,
+        source.timestamp < datetime.combine(end + timedelta(days=1), time.min)
+    ).order_by(source.timestamp, source.id).all()
+    
+    balance = opening_balance
+    lines = []
+    for t in transactions:
+        if t.to_account_id == id:
+            balance += t.amount
+        if t.from_account_id == id:
+            balance -= t.amount
+        lines.append(dict(TRANSACTION.from_row(t), running_balance=balance))
+    
+    return jsonify({
+        'account_id': account.id,
+        'account_number': account.account_number,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'opening_balance': opening_balance,
+        'closing_balance': balance,
+        'transactions': lines
+    })
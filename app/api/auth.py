@@ -0,0 +1,29 @@
+"""
+Shared authorization helpers
+"""
+from app import db
+from app.models import Account, Transaction
+
+def owned_account_ids(user_id):
+    """SELECT of the ids of the user's accounts, to be embedded in an IN (...) filter"""
+    return db.select(Account.id).where(Account.user_id == int(user_id))
+
+def visible_transactions_filter(user_id, source=Transaction):
+    """Filter matching transactions that touch at least one of the user's accounts"""
+    owned = owned_account_ids(user_id)
+    return source.from_account_id.in_(owned) | source.to_account_id.in_(owned)
+
+def owns_account_clause(account_id, user_id):
+    """EXISTS clause that is true when the account belongs to the user"""
+    return db.exists().where(Account.id == account_id, Account.user_id == int(user_id))
+
+def user_owns_account(account_id, user_id):
+    """Check ownership with a single EXISTS query, without loading the account"""
+    return db.session.query(owns_account_clause(account_id, user_id)).scalar()
+
+def check_account_owner(account_id, user_id):
+    """Load the account (404 if missing) and check that it belongs to the user"""
+    account = Account.query.get_or_404(account_id)
+    if account.user_id != int(user_id):
+        return False, account
+    return True, account
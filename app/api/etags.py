@@ -0,0 +1,19 @@
+"""
+Conditional GET helpers
+
+ETags are weak: they identify the data behind a response (row versions or
+the rows themselves), not its exact bytes.
+"""
+from flask import request, current_app
+
+def etag_matches(etag):
+    """Whether the request's If-None-Match covers etag"""
+    return request.if_none_match.contains_weak(etag)
+
+def conditional_response(etag, build):
+    """304 if the client already has etag, otherwise the response from build()"""
+    response = current_app.response_class(status=304) if etag_matches(etag) else build()
+    response.set_etag(etag, weak=True)
+    # Clients may keep the response but must revalidate before reusing it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
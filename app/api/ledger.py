@@ -0,0 +1,207 @@
+"""
+Atomic balance updates
+
+Balances are changed with single conditional UPDATE statements instead of
+read-check-write in Python, so concurrent workers cannot lose updates or
+overdraw an account. Each helper returns the owner's user id (via
+RETURNING, so callers can invalidate cached reads without another query)
+if the row was updated, or None if it wasn't.
+
+Hot accounts (balance_shards > 0) take credits on one of their
+BalanceShard rows, picked at random, so concurrent credits don't queue on
+the account row. Their balance is the account row plus the shards
+(total_balance() for reads). A debit the account row alone can't cover
+first collects the shards into it. Sharded accounts get no daily
+snapshots, which would be a hot row of their own; statements sum their
+history with balance_before() instead.
+"""
+import random
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import update, select, delete, insert, func, literal, bindparam, Date
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models import Account, BalanceSnapshot, BalanceShard
+from app.archive import transaction_source
+
+def _upsert():
+    # Both supported backends (SQLite, Postgres) have INSERT ... ON CONFLICT
+    dialect = db.session.get_bind().dialect.name
+    return postgresql.insert if dialect == 'postgresql' else sqlite.insert
+
+def _shard_sum(column):
+    return (select(func.coalesce(func.sum(column), 0))
+            .where(BalanceShard.account_id == Account.id).scalar_subquery())
+
+def total_balance():
+    """Account.balance plus the account's shards, as a column expression"""
+    return Account.balance + _shard_sum(BalanceShard.balance)
+
+def total_version():
+    """Account.version plus the shards' versions; grows with every change"""
+    return Account.version + _shard_sum(BalanceShard.version)
+
+def _apply(account_id, delta, owner_id=None, min_balance=None, unsharded=False):
+    stmt = update(Account).where(Account.id == account_id)
+    if unsharded:
+        stmt = stmt.where(Account.balance_shards == 0)
+    if owner_id is not None:
+        stmt = stmt.where(Account.user_id == int(owner_id))
+    if min_balance is not None:
+        stmt = stmt.where(Account.balance >= min_balance)
+    stmt = stmt.values(balance=Account.balance + delta, version=Account.version + 1)
+    stmt = stmt.returning(Account.user_id).execution_options(synchronize_session=False)
+    return db.session.execute(stmt).scalar()
+
+def credit(account_id, amount, owner_id=None):
+    """Add amount to the account's balance, or to one of its shards"""
+    owner = _apply(account_id, amount, owner_id, unsharded=True)
+    if owner is not None:
+        return owner
+    stmt = select(Account.user_id, Account.balance_shards).where(Account.id == account_id)
+    if owner_id is not None:
+        stmt = stmt.where(Account.user_id == int(owner_id))
+    row = db.session.execute(stmt).first()
+    if row is None or not row.balance_shards:
+        return None
+    insert = _upsert()
+    stmt = insert(BalanceShard).values(account_id=account_id, shard=random.randrange(row.balance_shards),
+                                       balance=amount, version=1)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['account_id', 'shard'],
+        set_={'balance': BalanceShard.balance + stmt.excluded.balance,
+              'version': BalanceShard.version + 1}))
+    return row.user_id
+
+def debit(account_id, amount, owner_id=None):
+    """Subtract amount from the account's balance if it is covered"""
+    owner = _apply(account_id, -amount, owner_id, min_balance=amount)
+    if owner is None and collect_shards([account_id]):
+        owner = _apply(account_id, -amount, owner_id, min_balance=amount)
+    return owner
+
+def lock_accounts(account_ids):
+    """Lock the accounts' rows before they are read for a check-then-write
+    in Python. The read itself uses FOR UPDATE, which SQLite ignores, so on
+    SQLite a no-op UPDATE takes the database write lock first; reads after
+    it see every committed change and no other writer can commit until
+    this transaction ends."""
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return
+    accounts = Account.__table__
+    db.session.execute(update(accounts).where(accounts.c.id.in_(sorted(set(account_ids))))
+                       .values(balance=accounts.c.balance))
+
+def collect_shards(account_ids):
+    """Move the accounts' shard balances into their account rows; returns
+    whether anything was moved"""
+    account_ids = sorted(set(account_ids))
+    # Account rows are locked before their shards, like transfers do, with a
+    # write rather than FOR UPDATE so that SQLite takes its write lock here,
+    # before the shards are read
+    accounts = Account.__table__
+    db.session.execute(update(accounts).where(accounts.c.id.in_(account_ids))
+                       .values(version=accounts.c.version + 1))
+    shards = db.session.execute(
+        select(BalanceShard.account_id, BalanceShard.shard, BalanceShard.balance)
+        .where(BalanceShard.account_id.in_(account_ids), BalanceShard.balance != 0)
+        .order_by(BalanceShard.account_id, BalanceShard.shard).with_for_update()).all()
+    if not shards:
+        return False
+    moved = defaultdict(float)
+    for account_id, _, balance in shards:
+        moved[account_id] += balance
+    conn = db.session.connection()
+    table = BalanceShard.__table__
+    # Subtract what was read rather than zeroing, so nothing can be lost
+    conn.execute(update(table).where(table.c.account_id == bindparam('account'),
+                                     table.c.shard == bindparam('shard_number'))
+                 .values(balance=table.c.balance - bindparam('seen'), version=table.c.version + 1),
+                 [{'account': account_id, 'shard_number': shard, 'seen': balance}
+                  for account_id, shard, balance in shards])
+    conn.execute(update(accounts).where(accounts.c.id == bindparam('account'))
+                 .values(balance=accounts.c.balance + bindparam('moved')),
+                 [{'account': account_id, 'moved': amount} for account_id, amount in moved.items()])
+    return True
+
+def balance_before(account_id, moment):
+    """The account's balance from its completed transactions before `moment`"""
+    source = transaction_source()
+    balance = 0.0
+    for column, sign in ((source.to_account_id, 1), (source.from_account_id, -1)):
+        balance += sign * db.session.scalar(
+            select(func.coalesce(func.sum(source.amount), 0.0))
+            .where(column == account_id, source.status == 'completed', source.timestamp < moment))
+    return balance
+
+def transfer(from_account_id, to_account_id, amount, owner_id=None):
+    """Move amount between accounts inside the current database transaction.
+
+    The two row updates are issued in ascending account id order, so two
+    opposite transfers always lock their rows in the same order and cannot
+    deadlock. Returns {account_id: owner id} for both accounts, or None if
+    either update matched no row, in which case the caller must roll back.
+    """
+    steps = [
+        (from_account_id, lambda: debit(from_account_id, amount, owner_id)),
+        (to_account_id, lambda: credit(to_account_id, amount)),
+    ]
+    owners = {}
+    for account_id, step in sorted(steps, key=lambda s: s[0]):
+        owner = step()
+        if owner is None:
+            return None
+        owners[account_id] = owner
+    return owners
+
+def record_snapshots(account_ids, day):
+    """Set each account's closing balance for `day` to its current balance.
+
+    Must run after the balance updates and before the commit, so the
+    snapshot lands in the same database transaction as the change.
+    """
+    insert = _upsert()
+    for account_id in sorted(set(account_ids)):
+        # Sharded accounts are skipped: the snapshot row would be as hot as the balance
+        closing = select(Account.id, literal(day, Date), total_balance()).where(
+            Account.id == account_id, Account.balance_shards == 0)
+        stmt = insert(BalanceSnapshot).from_select(['account_id', 'day', 'closing_balance'], closing)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['account_id', 'day'],
+            set_={'closing_balance': stmt.excluded.closing_balance}))
+
+def rebuild_snapshots(account_ids=None, chunk_size=500):
+    """Recompute the daily closing balances of the given accounts (all
+    accounts if None) from their completed transactions.
+
+    For writers that insert history out of order, e.g. bulk imports, where
+    record_snapshots can't be kept up to date row by row.
+    """
+    if account_ids is None:
+        account_ids = db.session.scalars(select(Account.id).order_by(Account.id)).all()
+    account_ids = sorted(set(account_ids))
+    # Archived history counts too
+    source = transaction_source()
+    day = func.date(source.timestamp)
+    for offset in range(0, len(account_ids), chunk_size):
+        chunk = account_ids[offset:offset + chunk_size]
+        deltas = defaultdict(float)
+        for column, sign in ((source.to_account_id, 1), (source.from_account_id, -1)):
+            rows = db.session.execute(
+                select(column, day, func.sum(source.amount))
+                .where(column.in_(chunk), source.status == 'completed')
+                .group_by(column, day)
+            )
+            for account_id, activity_day, total in rows:
+                deltas[(account_id, date.fromisoformat(str(activity_day)[:10]))] += sign * total
+
+        running = defaultdict(float)
+        snapshots = []
+        for (account_id, activity_day), delta in sorted(deltas.items()):
+            running[account_id] += delta
+            snapshots.append({'account_id': account_id, 'day': activity_day,
+                              'closing_balance': running[account_id]})
+        db.session.execute(delete(BalanceSnapshot).where(BalanceSnapshot.account_id.in_(chunk)))
+        if snapshots:
+            db.session.execute(insert(BalanceSnapshot), snapshots)
@@ -1,100 +1,403 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, abort, current_app, Response, stream_with_context, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Transaction, Account, User
-from app import db
+from app.models import Transaction, Account
+from app.idempotency import idempotent
+from app.api.auth import (check_account_owner, owned_account_ids, owns_account_clause,
+                          user_owns_account, visible_transactions_filter)
+from app.api import ledger
+from app import posting, search
+from app.archive import transaction_source
+from app.serializers import TRANSACTION
+from app.api.pagination import encode_cursor, decode_cursor, parse_limit
+from app import db, cache
+from sqlalchemy import select, insert, func, case, union_all
+from sqlalchemy.orm import aliased
 from datetime import datetime
+import csv
+import io
+import math
+import zlib
 
 bp = Blueprint('transactions', __name__)
 
-def check_account_owner(account_id, user_id):
-    """Check if the account belongs to the user"""
-    account = Account.query.get_or_404(account_id)
-    if str(account.user_id) != str(user_id):
-        return False, account
-    return True, account
+TRANSACTION_TYPES = ('deposit', 'withdrawal', 'transfer')
+
+# Rows fetched per round trip from the server-side cursor in streaming mode
+STREAM_BATCH_SIZE = 1000
+
+def stream_transactions(query):
+    """Yield a JSON array of transactions without materializing the result set"""
+    dumps = current_app.json.dumps
+    from_row = TRANSACTION.from_row
+    yield '['
+    first = True
+    for row in query.yield_per(STREAM_BATCH_SIZE):
+        yield ('' if first else ',') + dumps(from_row(row))
+        first = False
+    yield ']'
+
+def after_cursor(source, cursor):
+    """Keyset condition: rows strictly after the cursor's (timestamp, id) in
+    desc order. Raises ValueError (or TypeError) for an invalid cursor."""
+    cursor_ts, cursor_id = decode_cursor(cursor, 2)
+    cursor_ts = datetime.fromisoformat(cursor_ts)
+    # Compared with an integer column, so anything else (bool included) is malformed
+    if type(cursor_id) is not int:
+        raise ValueError('Invalid cursor')
+    return ((source.timestamp < cursor_ts) |
+            ((source.timestamp == cursor_ts) & (source.id < cursor_id)))
+
+def parse_amount_bound(value):
+    """Parse an amount filter, raising ValueError unless it is a finite number"""
+    amount = float(value)
+    # float() also accepts nan and inf, which compare with no amount sensibly
+    if not math.isfinite(amount):
+        raise ValueError('amount must be finite')
+    return amount
+
+def fetch_page(query, limit):
+    """Return (rows, next_cursor) for a query ordered by (timestamp, id) desc"""
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].timestamp.isoformat(), rows[-1].id)
+
+def ordered_transactions(source, filters, account_ids=None, descending=True):
+    """Query of the serialized columns of the source rows matching filters,
+    ordered by (timestamp, id). Given the accounts whose transactions are
+    listed, hot-table reads are a UNION ALL with one arm per account and
+    side, each walking that side's (account, timestamp, id) index in order,
+    so the database merges the arms instead of sorting every matching row.
+    A transfer between two of the accounts is only read by its from side."""
+    if source is Transaction and account_ids:
+        account_ids = sorted(set(account_ids))
+        columns = TRANSACTION.columns
+        arms = [select(*columns).where(Transaction.from_account_id == account_id, *filters)
+                for account_id in account_ids]
+        arms += [select(*columns).where(
+            Transaction.to_account_id == account_id,
+            Transaction.from_account_id.is_(None) | Transaction.from_account_id.not_in(account_ids),
+            *filters) for account_id in account_ids]
+        source = aliased(Transaction, union_all(*arms).subquery('ordered'))
+        filters = []
+    ordering = (source.timestamp, source.id)
+    if descending:
+        ordering = tuple(column.desc() for column in ordering)
+    return db.session.query(*TRANSACTION.columns_for(source)).filter(*filters).order_by(*ordering)
+
+def listed_account_ids(current_user_id, account_id=None):
+    """The accounts a listing covers: the one asked for, or all the user's"""
+    if account_id:
+        return [account_id]
+    return db.session.scalars(owned_account_ids(current_user_id)).all()
+
+def transaction_filters(current_user_id, source=None):
+    """Build the ownership, account and date filters shared by the read endpoints
+    from the request's query string. Returns (source, filters, error), where
+    source is the entity to query: the hot table, or hot and archived rows
+    together when the range reaches into archived months, unless one is given."""
+    account_id = request.args.get('account_id', type=int)
+    try:
+        start_date = request.args.get('start_date')
+        start_date = datetime.fromisoformat(start_date) if start_date else None
+    except ValueError:
+        return None, None, 'Invalid start_date format'
+    try:
+        end_date = request.args.get('end_date')
+        end_date = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        return None, None, 'Invalid end_date format'
+    
+    source = source or transaction_source(start_date)
+    # Base filter: transactions touching the user's accounts, with ownership
+    # resolved inside the same statement
+    filters = [visible_transactions_filter(current_user_id, source)]
+    
+    if account_id:
+        filters.append(owns_account_clause(account_id, current_user_id))
+        filters.append((source.from_account_id == account_id) |
+                       (source.to_account_id == account_id))
+    
+    if start_date:
+        filters.append(source.timestamp >= start_date)
+    
+    if end_date:
+        filters.append(source.timestamp <= end_date)
+    
+    return source, filters, None
 
 @bp.route('', methods=['GET'])
 @jwt_required()
 def get_transactions():
     current_user_id = get_jwt_identity()
-    
-    # Get query parameters for filtering
     account_id = request.args.get('account_id', type=int)
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
     
-    # Base query: get all transactions related to user's accounts
-    user_accounts = Account.query.filter_by(user_id=current_user_id).all()
-    account_ids = [acc.id for acc in user_accounts]
+    source, filters, error = transaction_filters(current_user_id)
+    if error:
+        return jsonify({'error': error}), 400
     
-    query = Transaction.query.filter(
-        (Transaction.from_account_id.in_(account_ids)) |
-        (Transaction.to_account_id.in_(account_ids))
-    )
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            filters.append(after_cursor(source, cursor))
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
     
-    # Apply filters if provided
-    if account_id:
-        if account_id not in account_ids:
+    # Only the serialized columns are selected; rows stay plain tuples
+    query = ordered_transactions(source, filters, listed_account_ids(current_user_id, account_id))
+    
+    # Streaming mode: send every remaining row as it comes off the cursor
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        if account_id and not user_owns_account(account_id, current_user_id):
             return jsonify({'error': 'Unauthorized access to account'}), 403
-        query = query.filter(
-            (Transaction.from_account_id == account_id) |
-            (Transaction.to_account_id == account_id)
-        )
+        return Response(stream_with_context(stream_transactions(query)),
+                        mimetype='application/json')
     
-    if start_date:
-        try:
-            start_date = datetime.fromisoformat(start_date)
-            query = query.filter(Transaction.timestamp >= start_date)
-        except ValueError:
-            return jsonify({'error': 'Invalid start_date format'}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if end_date:
+    transactions, next_cursor = fetch_page(query, limit)
+    # An empty page for a filtered account may mean it isn't the user's;
+    # only then pay for the extra ownership lookup
+    if not transactions and account_id and not user_owns_account(account_id, current_user_id):
+        return jsonify({'error': 'Unauthorized access to account'}), 403
+    
+    return jsonify({
+        'transactions': TRANSACTION.many(transactions),
+        'next_cursor': next_cursor
+    })
+
+@bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_transactions():
+    current_user_id = get_jwt_identity()
+    account_id = request.args.get('account_id', type=int)
+    
+    # Archived months are searched too when the range reaches them, without
+    # the full-text index (see app/search.py)
+    source, filters, error = transaction_filters(current_user_id)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    if 'q' in request.args:
+        words = search.query_words(request.args['q'])
+        if not words:
+            return jsonify({'error': 'q must contain at least one word'}), 400
+        filters.append(search.description_matches(words, source))
+    
+    try:
+        if 'min_amount' in request.args:
+            filters.append(source.amount >= parse_amount_bound(request.args['min_amount']))
+        if 'max_amount' in request.args:
+            filters.append(source.amount <= parse_amount_bound(request.args['max_amount']))
+    except ValueError:
+        return jsonify({'error': 'Invalid min_amount or max_amount'}), 400
+    
+    transaction_type = request.args.get('transaction_type')
+    if transaction_type:
+        transaction_type = transaction_type.lower()
+        if transaction_type not in TRANSACTION_TYPES:
+            return jsonify({'error': f'Transaction type must be one of: {", ".join(TRANSACTION_TYPES)}'}), 400
+        filters.append(source.transaction_type == transaction_type)
+    
+    try:
+        limit = parse_limit(request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    cursor = request.args.get('cursor')
+    if cursor:
         try:
-            end_date = datetime.fromisoformat(end_date)
-            query = query.filter(Transaction.timestamp <= end_date)
-        except ValueError:
-            return jsonify({'error': 'Invalid end_date format'}), 400
-    
-    transactions = query.order_by(Transaction.timestamp.desc()).all()
-    
-    return jsonify([{
-        'id': t.id,
-        'transaction_type': t.transaction_type,
-        'amount': t.amount,
-        'from_account_id': t.from_account_id,
-        'to_account_id': t.to_account_id,
-        'timestamp': t.timestamp.isoformat(),
-        'status': t.status,
-        'description': t.description
-    } for t in transactions])
+            filters.append(after_cursor(source, cursor))
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+    query = ordered_transactions(source, filters, listed_account_ids(current_user_id, account_id))
+    
+    transactions, next_cursor = fetch_page(query, limit)
+    if not transactions and account_id and not user_owns_account(account_id, current_user_id):
+        return jsonify({'error': 'Unauthorized access to account'}), 403
+    
+    return jsonify({
+        'transactions': TRANSACTION.many(transactions),
+        'next_cursor': next_cursor
+    })
 
-@bp.route('/<int:id>', methods=['GET'])
+@bp.route('/summary', methods=['GET'])
 @jwt_required()
-def get_transaction(id):
+def get_transactions_summary():
     current_user_id = get_jwt_identity()
-    transaction = Transaction.query.get_or_404(id)
     
-    # Check if user owns either the source or destination account
-    user_accounts = Account.query.filter_by(user_id=current_user_id).all()
-    account_ids = [acc.id for acc in user_accounts]
+    source, filters, error = transaction_filters(current_user_id)
+    if error:
+        return jsonify({'error': error}), 400
+    # Pending and failed transactions haven't moved any money
+    filters.append(source.status == 'completed')
     
-    if (transaction.from_account_id not in account_ids and 
-        transaction.to_account_id not in account_ids):
-        return jsonify({'error': 'Unauthorized access'}), 403
+    account_id = request.args.get('account_id', type=int)
+    if account_id and not user_owns_account(account_id, current_user_id):
+        return jsonify({'error': 'Unauthorized access to account'}), 403
+    
+    try:
+        top = parse_limit(request.args.get('top'), default=10, maximum=100)
+    except ValueError as e:
+        return jsonify({'error': str(e).replace('limit', 'top')}), 400
+    
+    # Every aggregate is a GROUP BY in the database; only the grouped rows
+    # come back, never one ORM object per transaction
+    owned = owned_account_ids(current_user_id)
+    day = func.date(source.timestamp)
+    total = func.sum(source.amount)
+    count = func.count(source.id)
+    
+    by_day = db.session.query(day, source.transaction_type, count, total).filter(
+        *filters).group_by(day, source.transaction_type).order_by(day, source.transaction_type).all()
+    
+    inflow = db.session.query(source.to_account_id, total).filter(
+        *filters, source.to_account_id.in_(owned)).group_by(source.to_account_id).all()
+    outflow = db.session.query(source.from_account_id, total).filter(
+        *filters, source.from_account_id.in_(owned)).group_by(source.from_account_id).all()
+    
+    # The counterparty of a transfer is whichever side the user doesn't own;
+    # transfers between the user's own accounts have none
+    counterparty = case((source.from_account_id.in_(owned), source.to_account_id),
+                        else_=source.from_account_id)
+    counterparties = db.session.query(counterparty, count, total).filter(
+        *filters,
+        source.transaction_type == 'transfer',
+        ~(source.from_account_id.in_(owned) & source.to_account_id.in_(owned))
+    ).group_by(counterparty).order_by(total.desc()).limit(top).all()
+    
+    by_type = {}
+    for _, transaction_type, n, amount in by_day:
+        entry = by_type.setdefault(transaction_type, {'transaction_type': transaction_type, 'count': 0, 'total': 0.0})
+        entry['count'] += n
+        entry['total'] += amount
+    
+    flows = {}
+    for account_id, amount in inflow:
+        flows.setdefault(account_id, {'account_id': account_id, 'inflow': 0.0, 'outflow': 0.0})['inflow'] = amount
+    for account_id, amount in outflow:
+        flows.setdefault(account_id, {'account_id': account_id, 'inflow': 0.0, 'outflow': 0.0})['outflow'] = amount
+    for entry in flows.values():
+        entry['net'] = entry['inflow'] - entry['outflow']
     
     return jsonify({
-        'id': transaction.id,
-        'transaction_type': transaction.transaction_type,
-        'amount': transaction.amount,
-        'from_account_id': transaction.from_account_id,
-        'to_account_id': transaction.to_account_id,
-        'timestamp': transaction.timestamp.isoformat(),
-        'status': transaction.status,
-        'description': transaction.description
+        'by_day': [{
+            'day': str(d)[:10],
+            'transaction_type': transaction_type,
+            'count': n,
+            'total': amount
+        } for d, transaction_type, n, amount in by_day],
+        'by_type': sorted(by_type.values(), key=lambda e: e['transaction_type']),
+        'accounts': sorted(flows.values(), key=lambda e: e['account_id']),
+        'top_counterparties': [{
+            'account_id': account_id,
+            'count': n,
+            'total': amount
+        } for account_id, n, amount in counterparties]
     })
 
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+def export_lines(query, export_format):
+    """Yield the export as text, one chunk per STREAM_BATCH_SIZE rows"""
+    from_row = TRANSACTION.from_row
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        
+        def render(rows):
+            writer.writerows(from_row(r).values() for r in rows)
+            text = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return text
+        
+        yield ','.join(TRANSACTION.keys) + '\n'
+    else:
+        dumps = current_app.json.dumps
+        
+        def render(rows):
+            return ''.join(dumps(from_row(r)) + '\n' for r in rows)
+    
+    batch = []
+    for row in query.yield_per(STREAM_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield render(batch)
+            batch.clear()
+    if batch:
+        yield render(batch)
+
+def gzip_chunks(chunks):
+    """Gzip a stream of text chunks incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+@bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_transactions():
+    current_user_id = get_jwt_identity()
+    account_id = request.args.get('account_id', type=int)
+    
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(EXPORT_FORMATS)}'}), 400
+    
+    source, filters, error = transaction_filters(current_user_id)
+    if error:
+        return jsonify({'error': error}), 400
+    if account_id and not user_owns_account(account_id, current_user_id):
+        return jsonify({'error': 'Unauthorized access to account'}), 403
+    
+    # Rows come off a server-side cursor in batches, so memory use stays flat
+    # however long the history is
+    query = ordered_transactions(source, filters, listed_account_ids(current_user_id, account_id),
+                                 descending=False)
+    chunks = export_lines(query, export_format)
+    headers = {
+        'Content-Disposition': f'attachment; filename=transactions.{export_format}',
+        'Vary': 'Accept-Encoding',
+    }
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format],
+                    headers=headers)
+
+@bp.route('/<int:id>', methods=['GET'])
+@jwt_required()
+def get_transaction(id):
+    current_user_id = get_jwt_identity()
+    # Load the transaction only if the user owns either the source or destination account
+    source = transaction_source()
+    transaction = db.session.query(*TRANSACTION.columns_for(source)).filter(
+        source.id == id,
+        visible_transactions_filter(current_user_id, source)
+    ).first()
+    
+    if transaction is None:
+        if db.session.query(source.id).filter(source.id == id).first() is None:
+            abort(404)
+        return jsonify({'error': 'Unauthorized access'}), 403
+    
+    return jsonify(TRANSACTION.from_row(transaction))
+
 @bp.route('', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_transaction():
     current_user_id = get_jwt_identity()
     data = request.get_json()
@@ -111,76 +414,291 @@ def create_transaction():
     if transaction_type not in valid_types:
         return jsonify({'error': f'Transaction type must be one of: {", ".join(valid_types)}'}), 400
     
-    # Handle different transaction types
     if transaction_type == 'transfer':
         if 'from_account_id' not in data or 'to_account_id' not in data:
             return jsonify({'error': 'Both from_account_id and to_account_id are required for transfers'}), 400
-        
-        # Check account ownership and existence
-        is_owner, from_account = check_account_owner(data['from_account_id'], current_user_id)
-        if not is_owner:
-            return jsonify({'error': 'Unauthorized access to source account'}), 403
-        
-        to_account = Account.query.get_or_404(data['to_account_id'])
-        
-        # Check sufficient balance
-        if from_account.balance < data['amount']:
+    elif 'account_id' not in data:
+        return jsonify({'error': 'account_id is required'}), 400
+    
+    if current_app.config['ASYNC_POSTING'] and 'respond-async' in request.headers.get('Prefer', ''):
+        return accept_transaction(data, transaction_type, current_user_id)
+    
+    # Handle different transaction types. Balances are changed with conditional
+    # UPDATEs; when one matches no row we roll back and work out why.
+    if transaction_type == 'transfer':
+        owners = ledger.transfer(data['from_account_id'], data['to_account_id'],
+                                 data['amount'], owner_id=current_user_id)
+        if owners is None:
+            db.session.rollback()
+            # Check account ownership and existence
+            is_owner, _ = check_account_owner(data['from_account_id'], current_user_id)
+            if not is_owner:
+                return jsonify({'error': 'Unauthorized access to source account'}), 403
+            Account.query.get_or_404(data['to_account_id'])
             return jsonify({'error': 'Insufficient balance'}), 400
         
-        # Perform transfer
-        from_account.balance -= data['amount']
-        to_account.balance += data['amount']
-        
         transaction = Transaction(
             transaction_type='transfer',
             amount=data['amount'],
-            from_account_id=from_account.id,
-            to_account_id=to_account.id,
+            from_account_id=data['from_account_id'],
+            to_account_id=data['to_account_id'],
             description=data.get('description', 'Transfer')
         )
         
     elif transaction_type in ['deposit', 'withdrawal']:
-        if 'account_id' not in data:
-            return jsonify({'error': 'account_id is required'}), 400
-        
-        is_owner, account = check_account_owner(data['account_id'], current_user_id)
-        if not is_owner:
-            return jsonify({'error': 'Unauthorized access to account'}), 403
+        if transaction_type == 'deposit':
+            owner = ledger.credit(data['account_id'], data['amount'], owner_id=current_user_id)
+        else:
+            owner = ledger.debit(data['account_id'], data['amount'], owner_id=current_user_id)
         
-        if transaction_type == 'withdrawal' and account.balance < data['amount']:
+        if owner is None:
+            db.session.rollback()
+            is_owner, _ = check_account_owner(data['account_id'], current_user_id)
+            if not is_owner:
+                return jsonify({'error': 'Unauthorized access to account'}), 403
             return jsonify({'error': 'Insufficient balance'}), 400
+        owners = {data['account_id']: owner}
         
-        # Update balance
         if transaction_type == 'deposit':
-            account.balance += data['amount']
             transaction = Transaction(
                 transaction_type='deposit',
                 amount=data['amount'],
-                to_account_id=account.id,
+                to_account_id=data['account_id'],
                 description=data.get('description', 'Deposit')
             )
         else:  # withdrawal
-            account.balance -= data['amount']
             transaction = Transaction(
                 transaction_type='withdrawal',
                 amount=data['amount'],
-                from_account_id=account.id,
+                from_account_id=data['account_id'],
                 description=data.get('description', 'Withdrawal')
             )
     
     db.session.add(transaction)
+    db.session.flush()
+    ledger.record_snapshots(owners, transaction.timestamp.date())
     db.session.commit()
+    cache.invalidate_accounts(owners)
     
     return jsonify({
         'message': 'Transaction completed successfully',
-        'transaction': {
-            'id': transaction.id,
-            'transaction_type': transaction.transaction_type,
-            'amount': transaction.amount,
-            'from_account_id': transaction.from_account_id,
-            'to_account_id': transaction.to_account_id,
-            'timestamp': transaction.timestamp.isoformat(),
-            'status': transaction.status,
-            'description': transaction.description
-        }
+        'transaction': TRANSACTION.from_object(transaction)
     }), 201
+
+def accept_transaction(data, transaction_type, current_user_id):
+    """Queue a validated transaction for the posting workers and answer 202"""
+    if transaction_type == 'transfer':
+        is_owner, _ = check_account_owner(data['from_account_id'], current_user_id)
+        if not is_owner:
+            return jsonify({'error': 'Unauthorized access to source account'}), 403
+        Account.query.get_or_404(data['to_account_id'])
+        account_id = data['from_account_id']
+        transaction = Transaction(
+            transaction_type='transfer',
+            amount=data['amount'],
+            from_account_id=data['from_account_id'],
+            to_account_id=data['to_account_id'],
+            description=data.get('description', 'Transfer')
+        )
+    else:
+        is_owner, _ = check_account_owner(data['account_id'], current_user_id)
+        if not is_owner:
+            return jsonify({'error': 'Unauthorized access to account'}), 403
+        account_id = data['account_id']
+        side = 'to_account_id' if transaction_type == 'deposit' else 'from_account_id'
+        transaction = Transaction(
+            transaction_type=transaction_type,
+            amount=data['amount'],
+            description=data.get('description', transaction_type.title()),
+            **{side: account_id}
+        )
+    
+    posting.enqueue(transaction, account_id, int(current_user_id))
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Transaction accepted for posting',
+        'transaction': TRANSACTION.from_object(transaction)
+    }), 202, {'Location': url_for('transactions.get_transaction', id=transaction.id)}
+
+# Upper bound on operations per batch request
+MAX_BATCH_SIZE = 5000
+
+def plan_batch_operation(data, accounts, current_user_id):
+    """Validate one batch operation against the preloaded accounts and apply
+    its balance change in memory. Returns (row, None) or (None, error)."""
+    if not isinstance(data, dict):
+        return None, 'Operation must be an object'
+    
+    required_fields = ['transaction_type', 'amount']
+    if not all(field in data for field in required_fields):
+        return None, 'Missing required fields'
+    
+    amount = data['amount']
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        return None, 'Amount must be a number'
+    if amount <= 0:
+        return None, 'Amount must be positive'
+    
+    transaction_type = str(data['transaction_type']).lower()
+    valid_types = ['deposit', 'withdrawal', 'transfer']
+    if transaction_type not in valid_types:
+        return None, f'Transaction type must be one of: {", ".join(valid_types)}'
+    
+    if transaction_type == 'transfer':
+        if 'from_account_id' not in data or 'to_account_id' not in data:
+            return None, 'Both from_account_id and to_account_id are required for transfers'
+        from_account = accounts.get(data['from_account_id'])
+        to_account = accounts.get(data['to_account_id'])
+        if from_account is None or to_account is None:
+            return None, 'Account not found'
+        if from_account.user_id != int(current_user_id):
+            return None, 'Unauthorized access to source account'
+        if from_account.balance < amount:
+            return None, 'Insufficient balance'
+        from_account.balance -= amount
+        to_account.balance += amount
+        return {
+            'transaction_type': 'transfer',
+            'amount': amount,
+            'from_account_id': from_account.id,
+            'to_account_id': to_account.id,
+            'description': data.get('description', 'Transfer')
+        }, None
+    
+    if 'account_id' not in data:
+        return None, 'account_id is required'
+    account = accounts.get(data['account_id'])
+    if account is None:
+        return None, 'Account not found'
+    if account.user_id != int(current_user_id):
+        return None, 'Unauthorized access to account'
+    
+    if transaction_type == 'deposit':
+        account.balance += amount
+        return {
+            'transaction_type': 'deposit',
+            'amount': amount,
+            'from_account_id': None,
+            'to_account_id': account.id,
+            'description': data.get('description', 'Deposit')
+        }, None
+    
+    if account.balance < amount:
+        return None, 'Insufficient balance'
+    account.balance -= amount
+    return {
+        'transaction_type': 'withdrawal',
+        'amount': amount,
+        'from_account_id': account.id,
+        'to_account_id': None,
+        'description': data.get('description', 'Withdrawal')
+    }, None
+
+@bp.route('/batch', methods=['POST'])
+@jwt_required()
+def create_transactions_batch():
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
+    
+    if not isinstance(data, dict) or not isinstance(data.get('operations'), list):
+        return jsonify({'error': 'operations must be a list'}), 400
+    operations = data['operations']
+    if not operations:
+        return jsonify({'error': 'operations must not be empty'}), 400
+    if len(operations) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'A batch may contain at most {MAX_BATCH_SIZE} operations'}), 400
+    
+    mode = data.get('mode', 'atomic')
+    if mode not in ('atomic', 'best_effort'):
+        return jsonify({'error': 'mode must be one of: atomic, best_effort'}), 400
+    
+    # Load and lock every account the batch touches in a single query.
+    account_ids = {
+        op.get(key) for op in operations if isinstance(op, dict)
+        for key in ('account_id', 'from_account_id', 'to_account_id')
+        if isinstance(op.get(key), int)
+    }
+    # Balances are checked and changed in Python and written back as values,
+    # so nothing may commit to these rows between the read and the commit
+    if account_ids:
+        ledger.lock_accounts(account_ids)
+    # Hot accounts' shard credits are moved into their rows first, so the
+    # balance checks below see whole balances. Only balances of the user's
+    # own accounts are checked, so only those are collected: an invalid or
+    # unauthorized operation must not touch (and re-version) anyone else's.
+    checked = {
+        op.get(key) for op in operations if isinstance(op, dict)
+        for key in ('account_id', 'from_account_id')
+        if isinstance(op.get(key), int)
+    }
+    sharded = db.session.scalars(select(Account.id).where(
+        Account.id.in_(checked), Account.user_id == int(current_user_id),
+        Account.balance_shards > 0)).all() if checked else []
+    if sharded:
+        ledger.collect_shards(sharded)
+    # Rows are locked in id order so concurrent batches and transfers cannot deadlock
+    accounts = {
+        account.id: account
+        for account in Account.query.filter(Account.id.in_(account_ids))
+                                    .order_by(Account.id).with_for_update()
+    } if account_ids else {}
+    
+    # Validate and apply balances in order, so later operations see earlier ones
+    results = []
+    rows = []
+    timestamp = datetime.utcnow()
+    for index, op in enumerate(operations):
+        row, error = plan_batch_operation(op, accounts, current_user_id)
+        if error:
+            results.append({'index': index, 'status': 'failed', 'error': error})
+            continue
+        row['timestamp'] = timestamp
+        row['status'] = 'completed'
+        rows.append(row)
+        results.append({'index': index, 'status': 'completed', 'row': row})
+    
+    failed = sum(1 for result in results if result['status'] == 'failed')
+    if mode == 'atomic' and failed:
+        db.session.rollback()
+        for result in results:
+            if result['status'] == 'completed':
+                result['status'] = 'rolled_back'
+                del result['row']
+        return jsonify({
+            'error': 'Batch rejected; no operations were applied',
+            'failed': failed,
+            'results': results
+        }), 400
+    
+    owners = {}
+    if rows:
+        touched = {account_id for row in rows
+                   for account_id in (row['from_account_id'], row['to_account_id'])
+                   if account_id is not None}
+        for account_id in touched:
+            # The rows are locked, so the version is bumped in Python like the
+            # balance and both go out in the same UPDATE
+            accounts[account_id].version += 1
+            owners[account_id] = accounts[account_id].user_id
+        ids = db.session.scalars(
+            insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True),
+            rows
+        ).all()
+        for row, transaction_id in zip(rows, ids):
+            row['id'] = transaction_id
+        ledger.record_snapshots(touched, timestamp.date())
+    db.session.commit()
+    cache.invalidate_accounts(owners)
+    
+    for result in results:
+        row = result.pop('row', None)
+        if row is not None:
+            result['transaction'] = dict(row, timestamp=row['timestamp'].isoformat())
+    
+    return jsonify({
+        'message': 'Batch processed',
+        'completed': len(rows),
+        'failed': failed,
+        'results': results
+    }), 201 if rows else 400
@@ -1,15 +1,21 @@
+import hashlib
+import sys
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from app.models import User, Account
-from app import db
+from app.models import User, Account, Transaction, BalanceSnapshot, BalanceShard, PostingQueue, LedgerWatermark
+from app import db, cache
+from app.archive import archive_partitions
+from app.cache import user_key
+from app.serializers import USER
+from app.api.pagination import encode_cursor, decode_cursor, parse_limit
+from app.api.etags import conditional_response
 from email_validator import validate_email, EmailNotValidError
+from sqlalchemy import select, update, delete, case
 
 bp = Blueprint('users', __name__)
 
 @bp.route('', methods=['POST'])
 def create_user():
-    print('Request Headers:', dict(request.headers))
-    print('Request Body:', request.get_data(as_text=True))
     data = request.get_json()
     
     # Validate required fields
@@ -48,18 +54,69 @@ def create_user():
         'access_token': access_token
     }), 201
 
+def prefix_upper_bound(prefix):
+    """The smallest string greater than every string starting with prefix,
+    in code point order, or None if there is none (all U+10FFFF)"""
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return None
+    following = ord(stem[-1]) + 1
+    # Surrogates can't be encoded; the next encodable code point follows them
+    if 0xD800 <= following <= 0xDFFF:
+        following = 0xE000
+    return stem[:-1] + chr(following)
+
+def email_prefix_filters(prefix):
+    """Match emails starting with prefix with a range comparison, which an
+    index serves where LIKE alone would scan. A range only equals a prefix
+    match under bytewise (code point) order: SQLite's default BINARY
+    collation, and "C" on Postgres, where ix_user_email_c indexes it."""
+    email = User.email
+    if db.session.get_bind().dialect.name == 'postgresql':
+        email = email.collate('C')
+    filters = [email >= prefix]
+    upper = prefix_upper_bound(prefix)
+    if upper is not None:
+        filters.append(email < upper)
+    return filters
+
 @bp.route('/all', methods=['GET'])
 @jwt_required()
 def get_all_users():
-    users = User.query.all()
-    return jsonify({
-        'users': [{
-            'id': user.id,
-            'email': user.email,
-            'name': user.name,
-            'created_at': user.created_at.isoformat() if user.created_at else None
-        } for user in users]
-    })
+    try:
+        limit = parse_limit(request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Only the public columns are selected, never password hashes, and the
+    # email index serves the ordering, the cursor and the prefix search
+    query = db.session.query(*USER.columns)
+    
+    email = request.args.get('email')
+    if email:
+        query = query.filter(*email_prefix_filters(email))
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            after_email, = decode_cursor(cursor, 1)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(User.email > str(after_email))
+    
+    users = query.order_by(User.email).limit(limit + 1).all()
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].email)
+    
+    # The ETag is taken from the rows themselves, so an unchanged page is
+    # answered with 304 before anything is serialized
+    etag = hashlib.sha1(repr((users, next_cursor)).encode()).hexdigest()
+    return conditional_response(etag, lambda: jsonify({
+        'users': USER.many(users),
+        'next_cursor': next_cursor
+    }))
 
 @bp.route('/me', methods=['GET'])
 @jwt_required()
@@ -78,19 +135,25 @@ def get_user_profile():
             'details': 'Invalid or expired token'
         }), 401
         
-    user = User.query.get(current_user_id)
-    if not user:
+    def load():
+        user = db.session.query(User.version, *USER.columns).filter(User.id == current_user_id).first()
+        return {'version': user[0], 'user': USER.from_row(user[1:])} if user else None
+    
+    # The current version comes from the database (one primary key lookup): the
+    # profile may have been changed or deleted by another worker, whose
+    # invalidation never reached this worker's cache
+    version = db.session.scalar(select(User.version).where(User.id == current_user_id))
+    profile = None
+    if version is not None:
+        profile = cache.get_or_set(user_key(current_user_id), load,
+                                   valid=lambda cached: cached['version'] == version)
+    if not profile:
         return jsonify({
             'error': 'User not found',
             'details': 'Your account could not be found'
         }), 404
     
-    return jsonify({
-        'id': user.id,
-        'email': user.email,
-        'name': user.name,
-        'created_at': user.created_at.isoformat()
-    })
+    return jsonify(profile['user'])
 
 @bp.route('/me', methods=['PUT'])
 @jwt_required()
@@ -107,7 +170,6 @@ def update_user_profile():
         
         try:
             data = request.get_json()
-            print(f'Received data: {data}')
         except Exception as e:
             return jsonify({'error': f'Invalid JSON format: {str(e)}'}), 400
             
@@ -146,7 +208,9 @@ def update_user_profile():
             user.set_password(data['password'])
         
         # Save changes
+        user.version += 1
         db.session.commit()
+        cache.delete(user_key(current_user_id))
         
         return jsonify({
             'message': 'Profile updated successfully',
@@ -171,15 +235,13 @@ def login():
     user = User.query.filter_by(email=data['email']).first()
     
     if user and user.check_password(data['password']):
+        # Persist a hash that was upgraded to the current parameters
+        if user in db.session.dirty:
+            db.session.commit()
         access_token = create_access_token(identity=str(user.id))
         return jsonify({
             'access_token': access_token,
-            'user': {
-                'id': user.id,
-                'email': user.email,
-                'name': user.name,
-                'created_at': user.created_at.isoformat()
-            }
+            'user': USER.from_object(user)
         })
     
     return jsonify({'error': 'Invalid email or password'}), 401
@@ -247,21 +309,46 @@ def delete_user():
         
     try:
         # Check if user exists
-        user = User.query.get(current_user_id)
-        if not user:
+        if not db.session.query(User.id).filter(User.id == current_user_id).first():
             return jsonify({
                 'error': 'User not found',
                 'details': 'Your account could not be found'
             }), 404
-            
-        # Delete all associated accounts (this will cascade delete transactions)
-        accounts = Account.query.filter_by(user_id=current_user_id).all()
-        for account in accounts:
-            db.session.delete(account)
         
-        # Delete the user
-        db.session.delete(user)
+        # Everything is removed with set-based statements in one database
+        # transaction, whatever the number of accounts and transactions
+        account_ids = db.session.scalars(
+            select(Account.id).where(Account.user_id == current_user_id)).all()
+        
+        pending = select(Transaction.id).where(
+            Transaction.status == 'pending',
+            Transaction.from_account_id.in_(account_ids) | Transaction.to_account_id.in_(account_ids))
+        db.session.execute(delete(PostingQueue).where(PostingQueue.transaction_id.in_(pending)))
+        db.session.execute(update(Transaction).where(Transaction.id.in_(pending)).values(status='failed'))
+        
+        # Transactions that only involve the user's accounts go; transfers with
+        # other users stay in their history with the user's side cleared
+        for table in [Transaction.__table__] + archive_partitions(account_ids):
+            c = table.c
+            db.session.execute(delete(table).where(
+                c.from_account_id.in_(account_ids) | c.to_account_id.in_(account_ids),
+                c.from_account_id.in_(account_ids) | c.from_account_id.is_(None),
+                c.to_account_id.in_(account_ids) | c.to_account_id.is_(None)))
+            db.session.execute(update(table).where(
+                c.from_account_id.in_(account_ids) | c.to_account_id.in_(account_ids)).values(
+                from_account_id=case((c.from_account_id.in_(account_ids), None),
+                                     else_=c.from_account_id),
+                to_account_id=case((c.to_account_id.in_(account_ids), None),
+                                   else_=c.to_account_id)))
+        
+        db.session.execute(delete(BalanceSnapshot).where(BalanceSnapshot.account_id.in_(account_ids)))
+        db.session.execute(delete(LedgerWatermark).where(LedgerWatermark.account_id.in_(account_ids)))
+        db.session.execute(delete(BalanceShard).where(BalanceShard.account_id.in_(account_ids)))
+        db.session.execute(delete(Account).where(Account.user_id == current_user_id))
+        db.session.execute(delete(User).where(User.id == current_user_id))
         db.session.commit()
+        cache.delete(user_key(current_user_id))
+        cache.invalidate_accounts({account_id: current_user_id for account_id in account_ids})
         
         return jsonify({
             'message': 'Your account and all associated data have been deleted successfully'
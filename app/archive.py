@@ -0,0 +1,166 @@
+"""
+Cold-history archival
+
+The `transaction` table is the hot partition: it keeps the recent months
+and takes every write. `flask archive run` moves whole calendar months
+older than ARCHIVE_HOT_MONTHS into transaction_archive. Archived rows keep
+their ids and columns but carry no foreign keys and only the two
+per-account indexes.
+
+On Postgres transaction_archive is natively partitioned by month
+(partitions are created as months are archived). On SQLite each month is
+its own transaction_archive_YYYY_MM table, and transaction_archive is a
+UNION ALL view over them. Read endpoints take their entity from
+transaction_source(): the hot table alone when the requested range starts
+after the archive horizon, otherwise hot and archived rows together.
+"""
+from datetime import date, datetime, time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import (MetaData, Table, Column, Index, String, select, insert, delete,
+                        union_all, func, text, inspect, table, column)
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import Transaction, ArchivedMonth
+
+PARTITION_PREFIX = 'transaction_archive_'
+COLUMN_NAMES = tuple(c.name for c in Transaction.__table__.columns)
+
+# Not part of db.metadata: created by migrations (Postgres) or as a view,
+# and never by create_all or autogenerate
+archive_table = Table('transaction_archive', MetaData(),
+                      *(Column(c.name, c.type) for c in Transaction.__table__.columns))
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def partition_name(month):
+    return f'{PARTITION_PREFIX}{month:%Y_%m}'
+
+def archive_horizon():
+    """Start of the month after the newest archived one, or None"""
+    # Read on every call rather than cached: `flask archive run` runs in its
+    # own process and couldn't invalidate the web workers' caches, and
+    # max(month) is a single primary-key read
+    newest = db.session.query(func.max(ArchivedMonth.month)).scalar()
+    if newest is None:
+        return None
+    return datetime.combine(next_month(date.fromisoformat(str(newest))), time.min)
+
+def combined_source():
+    """Entity over hot and archived transactions together"""
+    hot = select(*(Transaction.__table__.c[name] for name in COLUMN_NAMES))
+    cold = select(*(archive_table.c[name] for name in COLUMN_NAMES))
+    return aliased(Transaction, union_all(hot, cold).subquery('ledger'))
+
+def transaction_source(start=None):
+    """Entity for reading transactions from `start` (a datetime) onwards"""
+    horizon = archive_horizon()
+    if horizon is None or (start is not None and start >= horizon):
+        return Transaction
+    return combined_source()
+
+def archive_partitions(account_ids=None):
+    """Tables holding archived rows, for writes that must reach them too;
+    given account_ids, only the ones holding rows of those accounts"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return [archive_table]
+    if account_ids is None:
+        names = [name for name in inspect(db.session.connection()).get_table_names()
+                 if name.startswith(PARTITION_PREFIX)]
+    else:
+        # One lookup through the view instead of one statement per month table
+        c = archive_table.c
+        month = func.substr(c.timestamp, 1, 7, type_=String)
+        months = db.session.scalars(select(month).distinct().where(
+            c.from_account_id.in_(account_ids) | c.to_account_id.in_(account_ids)))
+        names = [PARTITION_PREFIX + month.replace('-', '_') for month in months]
+    return [table(name, *(column(c) for c in COLUMN_NAMES)) for name in sorted(names)]
+
+def create_partition(month):
+    """Create the archive partition for `month` if it doesn't exist yet"""
+    name = partition_name(month)
+    conn = db.session.connection()
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF transaction_archive "
+            f"FOR VALUES FROM ('{month}') TO ('{next_month(month)}') WITH (fillfactor = 100)"))
+        return
+    names = [n for n in inspect(conn).get_table_names() if n.startswith(PARTITION_PREFIX)]
+    if name in names:
+        return
+    columns = [Column(c.name, c.type, primary_key=c.primary_key)
+               for c in Transaction.__table__.columns]
+    Table(name, MetaData(), *columns,
+          Index(f'ix_{name}_from_account_timestamp', 'from_account_id', 'timestamp'),
+          Index(f'ix_{name}_to_account_timestamp', 'to_account_id', 'timestamp'),
+          ).create(conn)
+    # Rebuild the view over every month table
+    names = sorted(names + [name])
+    selects = ' UNION ALL '.join(f'SELECT {", ".join(COLUMN_NAMES)} FROM {n}' for n in names)
+    conn.execute(text('DROP VIEW IF EXISTS transaction_archive'))
+    conn.execute(text(f'CREATE VIEW transaction_archive AS {selects}'))
+
+def archive_month(month):
+    """Move a month of settled transactions to the archive; returns the row count"""
+    moved = [
+        Transaction.timestamp >= datetime.combine(month, time.min),
+        Transaction.timestamp < datetime.combine(next_month(month), time.min),
+        Transaction.status != 'pending',
+    ]
+    # Months with nothing to move get no partition (and no view rebuild)
+    if db.session.query(Transaction.id).filter(*moved).first() is None:
+        return 0
+    create_partition(month)
+    target = table(partition_name(month), *(column(c) for c in COLUMN_NAMES))
+    source = select(*(Transaction.__table__.c[name] for name in COLUMN_NAMES)).where(*moved)
+    rows = db.session.execute(insert(target).from_select(COLUMN_NAMES, source)).rowcount
+    if rows:
+        db.session.execute(delete(Transaction).where(*moved))
+        entry = db.session.get(ArchivedMonth, month)
+        if entry is None:
+            db.session.add(ArchivedMonth(month=month, rows=rows))
+        else:
+            entry.rows += rows
+            entry.archived_at = datetime.utcnow()
+    db.session.commit()
+    return rows
+
+def archive_before(cutoff):
+    """Archive every month before `cutoff` (the first day of a month)"""
+    oldest = db.session.query(func.min(Transaction.timestamp)).filter(
+        Transaction.timestamp < datetime.combine(cutoff, time.min)).scalar()
+    month = month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        yield month, archive_month(month)
+        month = next_month(month)
+
+archive_cli = AppGroup('archive', help='Move old transactions to the archive')
+
+@archive_cli.command('run')
+@click.option('--keep-months', type=int, help='Months kept hot (default: ARCHIVE_HOT_MONTHS)')
+def run_command(keep_months):
+    """Archive every month older than the hot window"""
+    keep = keep_months if keep_months is not None else current_app.config['ARCHIVE_HOT_MONTHS']
+    cutoff = month_start(datetime.utcnow().date())
+    for _ in range(keep):
+        cutoff = month_start(date.fromordinal(cutoff.toordinal() - 1))
+    total = 0
+    for month, rows in archive_before(cutoff):
+        click.echo(f'{month:%Y-%m}: {rows} rows archived')
+        total += rows
+    click.echo(f'{total} rows archived; months before {cutoff:%Y-%m} are cold')
+
+@archive_cli.command('status')
+def status_command():
+    """List archived months"""
+    hot = db.session.query(func.count(Transaction.id)).scalar()
+    click.echo(f'hot: {hot} rows')
+    for entry in db.session.query(ArchivedMonth).order_by(ArchivedMonth.month):
+        click.echo(f'{entry.month:%Y-%m}: {entry.rows} rows (archived {entry.archived_at:%Y-%m-%d})')
@@ -0,0 +1,71 @@
+"""
+Sharded balances for hot accounts
+
+    flask balance-shards enable 00000000018 --shards 16
+    flask balance-shards disable 00000000018
+    flask balance-shards list
+
+Enabling spreads the account's credits over N BalanceShard rows (see
+app/api/ledger.py). Disabling sends credits back to the account row,
+collects the shards into it and rebuilds the account's daily snapshots,
+which are not kept while it is sharded.
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select, update, delete, func
+
+from app import db, cache
+from app.api import ledger
+from app.models import Account, BalanceShard
+
+balance_shards_cli = AppGroup('balance-shards', help='Spread hot accounts\' credits over shard rows')
+
+def get_account(account_number):
+    account = db.session.scalars(
+        select(Account).where(Account.account_number == account_number)).first()
+    if account is None:
+        raise click.ClickException(f'No account {account_number}')
+    return account
+
+@balance_shards_cli.command('enable')
+@click.argument('account_number')
+@click.option('--shards', type=click.IntRange(1, 1024), default=16, show_default=True)
+def enable_command(account_number, shards):
+    """Spread ACCOUNT_NUMBER's credits over shard rows"""
+    account = get_account(account_number)
+    account.balance_shards = shards
+    db.session.commit()
+    click.echo(f'{account_number}: credits now spread over {shards} shards')
+
+@balance_shards_cli.command('disable')
+@click.argument('account_number')
+def disable_command(account_number):
+    """Send ACCOUNT_NUMBER's credits to the account row again"""
+    account = get_account(account_number)
+    account_id, user_id = account.id, account.user_id
+    # Committed first so no new credits reach the shards while they are collected
+    account.balance_shards = 0
+    db.session.commit()
+    ledger.collect_shards([account_id])
+    empty = BalanceShard.account_id == account_id, BalanceShard.balance == 0
+    # Versions of deleted shards move to the account so its ETags keep growing
+    versions = db.session.scalar(select(func.coalesce(func.sum(BalanceShard.version), 0)).where(*empty))
+    db.session.execute(delete(BalanceShard).where(*empty))
+    db.session.execute(update(Account).where(Account.id == account_id)
+                       .values(version=Account.version + versions))
+    ledger.rebuild_snapshots([account_id])
+    db.session.commit()
+    cache.invalidate_accounts({account_id: user_id})
+    click.echo(f'{account_number}: shards collected, credits go to the account again')
+
+@balance_shards_cli.command('list')
+def list_command():
+    """List sharded accounts and their balances"""
+    shard_total = (select(func.coalesce(func.sum(BalanceShard.balance), 0.0))
+                   .where(BalanceShard.account_id == Account.id).scalar_subquery())
+    rows = db.session.execute(
+        select(Account.account_number, Account.balance_shards, Account.balance, shard_total)
+        .where(Account.balance_shards > 0).order_by(Account.account_number))
+    for number, shards, balance, in_shards in rows:
+        click.echo(f'{number}: {shards} shards, balance {balance + in_shards:.2f} '
+                   f'({in_shards:.2f} in shards)')
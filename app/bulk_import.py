@@ -0,0 +1,339 @@
+"""
+Bulk import of users, accounts and historical transactions
+
+    flask import users users.ndjson
+    flask import accounts accounts.csv
+    flask import transactions history.ndjson.gz
+
+Files are NDJSON or CSV (optionally gzipped), picked by extension or by
+--format. Each batch is validated with one lookup per referenced table,
+written with executemany (COPY on Postgres) and committed together with
+the job's progress row. An interrupted import therefore resumes after its
+last committed batch when the same command is run again.
+
+Records reference each other by natural keys:
+
+- users: email, name, and password or password_hash (a PBKDF2 hash the app
+  can verify, taken as is); created_at optional
+- accounts: user_email, account_type, account_number (allocated if
+  missing); created_at optional
+- transactions: transaction_type, amount, timestamp, account_number for
+  deposits and withdrawals or from_account_number and to_account_number
+  for transfers; description optional
+
+Account balances are computed from the imported transactions, not
+checked against them, and daily snapshots are rebuilt once the import
+finishes.
+"""
+import csv
+import gzip
+import io
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+import click
+from email_validator import validate_email, EmailNotValidError
+from flask.cli import AppGroup
+from sqlalchemy import insert, update, bindparam
+
+from app import db
+from app.account_numbers import account_numbers
+from app.api import ledger
+from app.models import User, Account, Transaction, ImportJob
+from app.passwords import hash_passwords, is_password_hash
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+ACCOUNT_TYPES = ('savings', 'checking')
+TRANSACTION_TYPES = ('deposit', 'withdrawal', 'transfer')
+
+def read_records(path, file_format):
+    """Yield (line number, record dict) from an NDJSON or CSV file. A line
+    that isn't a JSON object yields a ValueError in place of the record."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            # The header is line 1
+            for line, record in enumerate(csv.DictReader(f), 2):
+                yield line, {k: v for k, v in record.items() if v != ''}
+        else:
+            for line, text in enumerate(f, 1):
+                if not text.strip():
+                    continue
+                try:
+                    record = json.loads(text)
+                except json.JSONDecodeError as e:
+                    yield line, ValueError(f'invalid JSON: {e.msg}')
+                    continue
+                if not isinstance(record, dict):
+                    yield line, ValueError('expected a JSON object')
+                    continue
+                yield line, record
+
+def write_rows(model, rows):
+    """Insert rows (dicts with the same keys) with executemany, or COPY on Postgres"""
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect
+    if dialect.name != 'postgresql':
+        db.session.execute(insert(model), rows)
+        return
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    # Strings are quoted, so only None becomes an (unquoted) empty field, i.e. NULL
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator='\n')
+    writer.writerows([row[column] for column in columns] for row in rows)
+    buffer.seek(0)
+    preparer = dialect.identifier_preparer
+    sql = (f'COPY {preparer.format_table(model.__table__)} '
+           f'({", ".join(preparer.quote(column) for column in columns)}) '
+           f'FROM STDIN WITH (FORMAT csv)')
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+def parse_timestamp(record, field, required=False):
+    value = record.get(field)
+    if value is None:
+        if required:
+            raise ValueError(f'{field} is required')
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be an ISO 8601 string')
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{field} must be an ISO 8601 string') from None
+
+def import_users(records, state):
+    errors, rows, plain = [], [], []
+    emails = [record.get('email') for _, record in records]
+    taken = {email for email, in db.session.query(User.email).filter(
+        User.email.in_([email for email in emails if isinstance(email, str)]))}
+    for line, record in records:
+        try:
+            email, name = record.get('email'), record.get('name')
+            if not email or not name:
+                raise ValueError('email and name are required')
+            if not isinstance(email, str) or not isinstance(name, str):
+                raise ValueError('email and name must be strings')
+            validate_email(email, check_deliverability=False)
+            if email in taken:
+                raise ValueError(f'email {email} already exists')
+            row = {'email': email, 'name': name, 'password_hash': record.get('password_hash'),
+                   'created_at': parse_timestamp(record, 'created_at') or datetime.utcnow()}
+            if row['password_hash'] is not None:
+                if (not isinstance(row['password_hash'], str)
+                        or not is_password_hash(row['password_hash'])):
+                    raise ValueError('password_hash is not a supported hash')
+            elif len(str(record.get('password', ''))) < 6:
+                raise ValueError('password (at least 6 characters) or password_hash is required')
+            else:
+                plain.append((row, str(record['password'])))
+        except (ValueError, EmailNotValidError) as e:
+            errors.append((line, str(e)))
+            continue
+        taken.add(email)
+        rows.append(row)
+    # Plain passwords are hashed together, across the whole hashing pool
+    for (row, _), password_hash in zip(plain, hash_passwords([p for _, p in plain])):
+        row['password_hash'] = password_hash
+    write_rows(User, rows)
+    return len(rows), errors
+
+def import_accounts(records, state):
+    errors, rows = [], []
+    users = dict(db.session.query(User.email, User.id).filter(User.email.in_(
+        [record['user_email'] for _, record in records
+         if isinstance(record.get('user_email'), str)])))
+    numbers = [str(record['account_number']) for _, record in records
+               if record.get('account_number') is not None]
+    taken = {number for number, in db.session.query(Account.account_number).filter(
+        Account.account_number.in_(numbers))}
+    for line, record in records:
+        try:
+            user_id = users.get(record.get('user_email')) \
+                if isinstance(record.get('user_email'), str) else None
+            if user_id is None:
+                raise ValueError(f'unknown user_email {record.get("user_email")}')
+            account_type = str(record.get('account_type', '')).lower()
+            if account_type not in ACCOUNT_TYPES:
+                raise ValueError(f'account_type must be one of: {", ".join(ACCOUNT_TYPES)}')
+            number = record.get('account_number')
+            if number is not None:
+                number = str(number)
+                if number in taken or len(number) > 20:
+                    raise ValueError(f'account_number {number} is taken or too long')
+            created_at = parse_timestamp(record, 'created_at') or datetime.utcnow()
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+        number = number or account_numbers.allocate()
+        taken.add(number)
+        rows.append({'account_number': number, 'account_type': account_type, 'balance': 0.0,
+                     'user_id': user_id, 'created_at': created_at})
+    write_rows(Account, rows)
+    return len(rows), errors
+
+def import_transactions(records, state):
+    errors, rows = [], []
+    numbers = set()
+    for _, record in records:
+        for field in ('account_number', 'from_account_number', 'to_account_number'):
+            if record.get(field) is not None:
+                numbers.add(str(record[field]))
+    accounts = dict(db.session.query(Account.account_number, Account.id).filter(
+        Account.account_number.in_(numbers)))
+
+    def account(record, field):
+        number = record.get(field)
+        if number is None:
+            raise ValueError(f'{field} is required')
+        if str(number) not in accounts:
+            raise ValueError(f'unknown {field} {number}')
+        return accounts[str(number)]
+
+    deltas = {}
+    for line, record in records:
+        try:
+            transaction_type = str(record.get('transaction_type', '')).lower()
+            if transaction_type not in TRANSACTION_TYPES:
+                raise ValueError(f'transaction_type must be one of: {", ".join(TRANSACTION_TYPES)}')
+            try:
+                amount = float(record.get('amount', 0))
+            except (TypeError, ValueError):
+                raise ValueError('amount must be a number') from None
+            if not math.isfinite(amount) or amount <= 0:
+                raise ValueError('amount must be positive')
+            row = {'transaction_type': transaction_type, 'amount': amount,
+                   'from_account_id': None, 'to_account_id': None,
+                   'timestamp': parse_timestamp(record, 'timestamp', required=True),
+                   'status': 'completed',
+                   'description': record.get('description', transaction_type.title())}
+            if not isinstance(row['description'], (str, type(None))):
+                raise ValueError('description must be a string')
+            if transaction_type == 'transfer':
+                row['from_account_id'] = account(record, 'from_account_number')
+                row['to_account_id'] = account(record, 'to_account_number')
+            elif transaction_type == 'deposit':
+                row['to_account_id'] = account(record, 'account_number')
+            else:
+                row['from_account_id'] = account(record, 'account_number')
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+        if row['from_account_id']:
+            deltas[row['from_account_id']] = deltas.get(row['from_account_id'], 0.0) - amount
+        if row['to_account_id']:
+            deltas[row['to_account_id']] = deltas.get(row['to_account_id'], 0.0) + amount
+        rows.append(row)
+
+    write_rows(Transaction, rows)
+    # One executemany UPDATE per batch, committed with the rows it accounts for
+    if deltas:
+        account_table = Account.__table__
+        db.session.connection().execute(
+            update(account_table)
+            .where(account_table.c.id == bindparam('account'))
+            .values(balance=account_table.c.balance + bindparam('delta'),
+                    version=account_table.c.version + 1),
+            [{'account': id, 'delta': delta} for id, delta in sorted(deltas.items())])
+    state['touched'].update(deltas)
+    return len(rows), errors
+
+def finish_transactions(state):
+    # A resumed import doesn't know which accounts the earlier runs touched
+    ledger.rebuild_snapshots(None if state['resumed'] else state['touched'])
+
+IMPORTERS = {
+    'users': (import_users, None),
+    'accounts': (import_accounts, None),
+    'transactions': (import_transactions, finish_transactions),
+}
+
+def run_import(kind, path, file_format, batch_size, skip_invalid, restart):
+    importer, finish = IMPORTERS[kind]
+    if file_format is None:
+        file_format = 'csv' if '.csv' in os.path.basename(path) else 'ndjson'
+
+    job_id = f'{kind}:{os.path.basename(path)}'
+    job = db.session.get(ImportJob, job_id)
+    if job is None or restart:
+        job = job or ImportJob(id=job_id)
+        job.rows_done, job.started_at, job.finished_at = 0, datetime.utcnow(), None
+        db.session.add(job)
+        db.session.commit()
+    elif job.finished_at is not None:
+        click.echo(f'{job_id} already finished at {job.finished_at}; use --restart to run it again')
+        return
+    skip = job.rows_done
+    state = {'touched': set(), 'resumed': skip > 0}
+    if skip:
+        click.echo(f'Resuming {job_id} after {skip} rows')
+
+    imported = rejected = 0
+    started = time.perf_counter()
+    batch = []
+
+    def flush():
+        nonlocal imported, rejected
+        # Lines that couldn't be parsed are reported with the importer's errors
+        unparsed = [(line, str(record)) for line, record in batch if isinstance(record, Exception)]
+        count, errors = importer([(line, record) for line, record in batch
+                                  if not isinstance(record, Exception)], state)
+        errors = sorted(unparsed + errors)
+        if errors and not skip_invalid:
+            db.session.rollback()
+            details = '\n'.join(f'  line {line}: {message}'
+                                for line, message in errors[:MAX_REPORTED_ERRORS])
+            raise click.ClickException(
+                f'{len(errors)} invalid rows in the batch starting at line {batch[0][0]}, '
+                f'nothing from it was imported (--skip-invalid skips them):\n{details}')
+        for line, message in errors[:MAX_REPORTED_ERRORS]:
+            click.echo(f'skipped line {line}: {message}', err=True)
+        job.rows_done += len(batch)
+        db.session.commit()
+        imported += count
+        rejected += len(errors)
+        elapsed = time.perf_counter() - started
+        click.echo(f'{job.rows_done} rows read, {imported} imported, {rejected} skipped '
+                   f'({(imported + rejected) / elapsed:.0f} rows/s)')
+        batch.clear()
+
+    for index, (line, record) in enumerate(read_records(path, file_format)):
+        if index < skip:
+            continue
+        batch.append((line, record))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if finish is not None:
+        finish(state)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    click.echo(f'Imported {imported} {kind} ({rejected} skipped) in {elapsed:.1f}s')
+
+import_cli = AppGroup('import', help='Bulk import from NDJSON or CSV files')
+
+def import_command(kind):
+    @import_cli.command(kind, help=f'Import {kind} from FILE')
+    @click.argument('path', metavar='FILE', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'file_format', type=click.Choice(['ndjson', 'csv']),
+                  help='File format (default: from the file name)')
+    @click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+    @click.option('--skip-invalid', is_flag=True, help='Skip invalid rows instead of stopping')
+    @click.option('--restart', is_flag=True, help='Ignore the progress of an earlier run')
+    def command(path, file_format, batch_size, skip_invalid, restart):
+        run_import(kind, path, file_format, batch_size, skip_invalid, restart)
+    return command
+
+for kind in IMPORTERS:
+    import_command(kind)
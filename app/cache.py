@@ -0,0 +1,113 @@
+"""
+Read-through cache for rarely changing, frequently polled reads
+
+Values are the JSON-ready dicts the endpoints return, never ORM objects.
+The default backend is an in-process LRU with a TTL. A shared backend
+(e.g. Redis or memcached) can be plugged in with CACHE_BACKEND set to
+'module:Class'; the class is built with the app config and must provide
+get(key), set(key, value, ttl) and delete(*keys). With the in-process
+backend each worker has its own copy, and invalidation only reaches the
+worker that made the write. Profile and account reads therefore never
+trust a cached body on its own: they read the row's version (one primary
+key lookup) and serve the cached body only when it carries the same
+version.
+"""
+import threading
+import time
+from collections import OrderedDict
+from importlib import import_module
+
+from app.replicas import reading_replica
+
+class MemoryBackend:
+    """Thread-safe in-process LRU cache with per-entry expiry"""
+
+    def __init__(self, config):
+        self.max_entries = config['CACHE_MAX_ENTRIES']
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+class Cache:
+    """Flask extension wrapping a cache backend with hit/miss counters"""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 0
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'app.cache:MemoryBackend')
+        app.config.setdefault('CACHE_TTL', 30)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 10000)
+        module_name, _, class_name = app.config['CACHE_BACKEND'].partition(':')
+        self.backend = getattr(import_module(module_name), class_name)(app.config)
+        self.ttl = app.config['CACHE_TTL']
+        app.extensions['cache'] = self
+
+    def get_or_set(self, key, loader, valid=None):
+        """Return the cached value for key, calling loader() to fill a miss.
+        A cached value for which valid(value) is false counts as a miss and
+        is replaced. A loader result of None (e.g. not found), or one read
+        from a replica, is returned but not cached."""
+        value = self.backend.get(key)
+        if value is not None and (valid is None or valid(value)):
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = loader()
+        # Replica reads may predate a write that already invalidated the key
+        if value is not None and not reading_replica():
+            self.backend.set(key, value, self.ttl)
+        return value
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def invalidate_accounts(self, owners):
+        """Drop cached reads that include any of the accounts, given as
+        {account_id: owner user id}; call after the commit"""
+        keys = set()
+        for account_id, user_id in owners.items():
+            keys.add(account_key(account_id))
+            keys.add(accounts_key(user_id))
+        self.delete(*keys)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+# Cache keys, kept in one place so readers and invalidating writers agree
+def user_key(user_id):
+    return f'user:{int(user_id)}'
+
+def accounts_key(user_id):
+    return f'accounts:{int(user_id)}'
+
+def account_key(account_id):
+    return f'account:{int(account_id)}'
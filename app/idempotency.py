@@ -0,0 +1,168 @@
+"""
+Idempotency keys for retried writes
+
+A client that may retry POST /transactions or POST /accounts sends an
+`Idempotency-Key` header with a value unique to the operation. The first
+request with a key claims it by inserting a row on a separate, immediately
+committed connection, runs the view and stores the response in that row.
+Later requests with the same key from the same user are answered from the
+row, with `Idempotent-Replayed: true`, without running the view, so
+nothing is validated, locked or posted again. A duplicate that arrives
+while the first request is still running polls the row until the response
+is stored, or answers 409 after IDEMPOTENCY_WAIT_SECONDS.
+
+- Reusing a key for a different request (method, path or body) is a 422.
+- 5xx responses and exceptions release the claim, so a retry runs again.
+- A claim whose request died (no response after IDEMPOTENCY_LOCK_SECONDS)
+  is taken over by the next request with the same key and body.
+- Rows expire IDEMPOTENCY_TTL seconds after the first request; requests
+  claiming new keys purge expired rows every IDEMPOTENCY_PURGE_INTERVAL
+  seconds, which keeps the table bounded.
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import request, jsonify, current_app, make_response
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select, update, delete, and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+# Response headers replayed along with the status and body
+STORED_HEADERS = ('Content-Type', 'Location')
+
+keys = IdempotencyKey.__table__
+
+def request_fingerprint():
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+def _key_filter(user_id, key):
+    return and_(keys.c.user_id == user_id, keys.c.key == key)
+
+def lookup(user_id, key):
+    with db.engine.connect() as conn:
+        return conn.execute(select(keys).where(_key_filter(user_id, key))).first()
+
+def claim(user_id, key, fingerprint, lock_seconds, ttl):
+    """Claim the key for this request on a separate, immediately committed
+    connection. Returns None if the request now owns the key, otherwise
+    the key's existing row."""
+    now = datetime.utcnow()
+    values = dict(fingerprint=fingerprint, status_code=None, headers=None, body=None,
+                  created_at=now, locked_until=now + timedelta(seconds=lock_seconds),
+                  expires_at=now + timedelta(seconds=ttl))
+    with db.engine.begin() as conn:
+        dialect = conn.dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        inserted = conn.execute(insert(keys).values(user_id=user_id, key=key, **values)
+                                .on_conflict_do_nothing()).rowcount
+        if inserted:
+            return None
+        # An expired row, or an abandoned claim for the same request, is taken over
+        taken = conn.execute(update(keys).where(
+            _key_filter(user_id, key),
+            or_(keys.c.expires_at < now,
+                and_(keys.c.status_code.is_(None), keys.c.locked_until < now,
+                     keys.c.fingerprint == fingerprint)),
+        ).values(**values)).rowcount
+        if taken:
+            return None
+        return conn.execute(select(keys).where(_key_filter(user_id, key))).first()
+
+def store(user_id, key, response):
+    with db.engine.begin() as conn:
+        conn.execute(update(keys).where(_key_filter(user_id, key)).values(
+            status_code=response.status_code,
+            headers={name: response.headers[name] for name in STORED_HEADERS
+                     if name in response.headers},
+            body=response.get_data(),
+            locked_until=None))
+
+def release(user_id, key):
+    with db.engine.begin() as conn:
+        conn.execute(delete(keys).where(_key_filter(user_id, key), keys.c.status_code.is_(None)))
+
+def replay(row):
+    response = current_app.response_class(row.body, status=row.status_code, headers=row.headers)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def idempotent(view):
+    """Make a POST view honour Idempotency-Key; goes below @jwt_required()"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not 0 < len(key) <= keys.c.key.type.length:
+            return jsonify({'error': f'{HEADER} must be 1 to {keys.c.key.type.length} characters'}), 400
+
+        config = current_app.config
+        user_id = int(get_jwt_identity())
+        fingerprint = request_fingerprint()
+        current_app.extensions['idempotency'].purge_expired()
+        row = claim(user_id, key, fingerprint, config['IDEMPOTENCY_LOCK_SECONDS'],
+                    config['IDEMPOTENCY_TTL'])
+        deadline = time.monotonic() + config['IDEMPOTENCY_WAIT_SECONDS']
+        while row is not None:
+            if row.fingerprint != fingerprint:
+                return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+            if row.status_code is not None:
+                return replay(row)
+            if time.monotonic() >= deadline:
+                response = jsonify({'error': f'A request with this {HEADER} is still in progress'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            # Wait for the first request's response
+            time.sleep(config['IDEMPOTENCY_POLL_INTERVAL'])
+            row = lookup(user_id, key)
+            if row is None or (row.status_code is None and row.locked_until < datetime.utcnow()):
+                row = claim(user_id, key, fingerprint, config['IDEMPOTENCY_LOCK_SECONDS'],
+                            config['IDEMPOTENCY_TTL'])
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            release(user_id, key)
+            raise
+        if response.status_code >= 500:
+            release(user_id, key)
+        else:
+            store(user_id, key, response)
+        return response
+    return wrapper
+
+class Idempotency:
+    """Flask extension holding the idempotency key settings and purging expired keys"""
+
+    def __init__(self, app=None):
+        self._next_purge = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IDEMPOTENCY_TTL', 86400)
+        app.config.setdefault('IDEMPOTENCY_LOCK_SECONDS', 60)
+        app.config.setdefault('IDEMPOTENCY_WAIT_SECONDS', 10)
+        app.config.setdefault('IDEMPOTENCY_POLL_INTERVAL', 0.05)
+        app.config.setdefault('IDEMPOTENCY_PURGE_INTERVAL', 60)
+        app.extensions['idempotency'] = self
+
+    def purge_expired(self):
+        """Delete expired keys, at most once per IDEMPOTENCY_PURGE_INTERVAL per process"""
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + current_app.config['IDEMPOTENCY_PURGE_INTERVAL']
+        with db.engine.begin() as conn:
+            conn.execute(delete(keys).where(keys.c.expires_at < datetime.utcnow()))
+
+idempotency = Idempotency()
@@ -0,0 +1,31 @@
+"""
+Fast JSON provider
+
+Selected with the JSON_PROVIDER setting ('module:Class'). OrjsonProvider
+encodes with orjson and falls back to Flask's default provider when
+orjson isn't installed. Output matches the default provider: keys are
+sorted and dates go through the same default() hook.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    if orjson is not None:
+        options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default, option=self.options).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            # Hand orjson's bytes straight to the response, skipping a str round trip
+            return self._app.response_class(
+                orjson.dumps(obj, default=self.default, option=self.options),
+                mimetype=self.mimetype)
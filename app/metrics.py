@@ -0,0 +1,137 @@
+"""
+Per-request performance instrumentation
+
+Records, per endpoint, a latency histogram, the number of SQL statements
+and time spent in SQL, and the response size, and serves them in the
+Prometheus text format at /metrics. Requests that run more than
+METRICS_QUERY_WARN_THRESHOLD statements are logged as warnings so N+1
+regressions show up in the logs. Metrics are kept per process; with
+several gunicorn workers each scrape sees one worker.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request, has_request_context, current_app, Response
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+class Histogram:
+    """Cumulative Prometheus-style histogram, one series per label set"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts, total = self.series.get(labels, (None, 0))
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(self.series.items()):
+            label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+class Metrics:
+    """Flask extension collecting request metrics"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.latency = Histogram('http_request_duration_seconds',
+                                 'Request latency by endpoint', LATENCY_BUCKETS)
+        self.queries = Histogram('http_request_sql_queries',
+                                 'SQL statements run per request', QUERY_COUNT_BUCKETS)
+        self.sql_time = Histogram('http_request_sql_duration_seconds',
+                                  'Time spent in SQL per request', LATENCY_BUCKETS)
+        self.size = Histogram('http_response_size_bytes',
+                              'Response body size', SIZE_BUCKETS)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_QUERY_WARN_THRESHOLD', 20)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.extensions['metrics'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+        from app import db
+        with app.app_context():
+            # Replica binds included
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_sql_time = 0.0
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        if has_request_context() and 'metrics_queries' in g:
+            g.metrics_queries += 1
+            g.metrics_sql_time += elapsed
+
+    def _after_request(self, response):
+        if 'metrics_started' not in g or request.endpoint == 'metrics':
+            return response
+        elapsed = time.perf_counter() - g.metrics_started
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = (('endpoint', endpoint), ('method', request.method))
+        with self._lock:
+            self.latency.observe(labels + (('status', str(response.status_code)),), elapsed)
+            self.queries.observe(labels, g.metrics_queries)
+            self.sql_time.observe(labels, g.metrics_sql_time)
+            # Streamed responses have no length up front and aren't counted
+            if response.content_length is not None:
+                self.size.observe(labels, response.content_length)
+
+        threshold = current_app.config['METRICS_QUERY_WARN_THRESHOLD']
+        if threshold and g.metrics_queries > threshold:
+            current_app.logger.warning(
+                '%s %s ran %d SQL queries (threshold %d, %.1fms in SQL)',
+                request.method, request.path, g.metrics_queries, threshold,
+                g.metrics_sql_time * 1000)
+        return response
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for histogram in (self.latency, self.queries, self.sql_time, self.size):
+                lines.extend(histogram.render())
+        cache = current_app.extensions.get('cache')
+        if cache is not None:
+            stats = cache.stats()
+            lines += ['# HELP cache_hits_total Read-through cache hits',
+                      '# TYPE cache_hits_total counter',
+                      f'cache_hits_total {stats["hits"]}',
+                      '# HELP cache_misses_total Read-through cache misses',
+                      '# TYPE cache_misses_total counter',
+                      f'cache_misses_total {stats["misses"]}']
+        return '\n'.join(lines) + '\n'
+
+    def _metrics_view(self):
+        token = current_app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
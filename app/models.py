@@ -1,28 +1,38 @@
 from datetime import datetime
 from app import db
-from passlib.hash import pbkdf2_sha256
+from app import passwords
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
     name = db.Column(db.String(64), nullable=False)
+    # Bumped with every profile change; cached profiles are checked against it
+    version = db.Column(db.BigInteger, nullable=False, default=1, server_default='1')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     accounts = db.relationship('Account', backref='owner', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = pbkdf2_sha256.hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return pbkdf2_sha256.verify(password, self.password_hash)
+        # Hashes made under old parameters are replaced; the caller commits
+        valid, new_hash = passwords.verify_and_update(password, self.password_hash)
+        if valid and new_hash:
+            self.password_hash = new_hash
+        return valid
 
 class Account(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     account_number = db.Column(db.String(20), unique=True, nullable=False)
     account_type = db.Column(db.String(20), nullable=False)
     balance = db.Column(db.Float, default=0.0)
+    # Bumped with every balance or type change; ETags are derived from it
+    version = db.Column(db.BigInteger, nullable=False, default=1, server_default='1')
+    # Number of BalanceShard rows credits are spread over (0: credits go to balance)
+    balance_shards = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     transactions_from = db.relationship('Transaction', 
                                      foreign_keys='Transaction.from_account_id',
                                      backref='from_account', lazy='dynamic')
@@ -31,6 +41,17 @@ class Account(db.Model):
                                    backref='to_account', lazy='dynamic')
 
 class Transaction(db.Model):
+    # Listings filter on (from_account_id OR to_account_id) and page by (timestamp, id),
+    # so each side of the OR gets its own composite index that also serves the ordering
+    __table_args__ = (
+        db.Index('ix_transaction_from_account_timestamp', 'from_account_id', 'timestamp', 'id'),
+        db.Index('ix_transaction_to_account_timestamp', 'to_account_id', 'timestamp', 'id'),
+        db.Index('ix_transaction_timestamp_id', 'timestamp', 'id'),
+        # Archived rows keep their ids, so SQLite must never hand one out again
+        # after the newest hot row is deleted
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     transaction_type = db.Column(db.String(20), nullable=False)  # deposit, withdrawal, transfer
     amount = db.Column(db.Float, nullable=False)
@@ -39,3 +60,78 @@ class Transaction(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='completed')
     description = db.Column(db.String(200))
+
+class BalanceSnapshot(db.Model):
+    """Closing balance of an account at the end of a (UTC) day, kept up to
+    date as transactions commit so statements never replay full history"""
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'),
+                           primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    closing_balance = db.Column(db.Float, nullable=False)
+
+class BalanceShard(db.Model):
+    """Part of a hot account's balance. Credits to an account with
+    balance_shards set land on a random shard row instead of the account
+    row; reads add them up (see app/api/ledger.py)"""
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'),
+                           primary_key=True, autoincrement=False)
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    balance = db.Column(db.Float, nullable=False, default=0.0)
+    # Bumped with every change, so account ETags can include shard changes
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+class AccountNumberBlock(db.Model):
+    """Single-row counter of account number serials; processes reserve
+    blocks from it (see app/account_numbers.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    next_serial = db.Column(db.BigInteger, nullable=False, default=1)
+
+class PostingQueue(db.Model):
+    """Pending transactions waiting for a posting worker (see app/posting.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id', ondelete='CASCADE'),
+                               unique=True, nullable=False)
+    # The account whose balance the transaction checks (the credited one for
+    # deposits); workers post each account's queue in one database transaction
+    account_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow)
+    leased_until = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+class ImportJob(db.Model):
+    """Progress of a `flask import` run; an interrupted import resumes after
+    its last committed batch (see app/bulk_import.py)"""
+    id = db.Column(db.String(255), primary_key=True)
+    rows_done = db.Column(db.BigInteger, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class ArchivedMonth(db.Model):
+    """A calendar month of transactions moved to the archive (see app/archive.py)"""
+    month = db.Column(db.Date, primary_key=True)  # first day of the month
+    rows = db.Column(db.BigInteger, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class IdempotencyKey(db.Model):
+    """Responses stored for requests sent with an Idempotency-Key header (see app/idempotency.py)"""
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    key = db.Column(db.String(255), primary_key=True)
+    # sha256 of the method, path and body the key was first used with
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # Null while the first request is in flight
+    status_code = db.Column(db.Integer)
+    headers = db.Column(db.JSON)
+    body = db.Column(db.LargeBinary)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class LedgerWatermark(db.Model):
+    """How far `flask reconcile` has summed an account's ledger (see app/reconcile.py)"""
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'),
+                           primary_key=True, autoincrement=False)
+    # Completed transactions with ids up to through_id add up to balance_cents
+    through_id = db.Column(db.BigInteger, nullable=False)
+    balance_cents = db.Column(db.BigInteger, nullable=False)
+    reconciled_at = db.Column(db.DateTime, default=datetime.utcnow)
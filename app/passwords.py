@@ -0,0 +1,84 @@
+"""
+Password hashing off the request path
+
+PBKDF2 is deliberately CPU-heavy, so hashing and verification run in a
+small, bounded process pool instead of on the request worker. The round
+count comes from PASSWORD_HASH_ROUNDS; hashes made with other parameters
+are reported by verify_and_update so callers can upgrade them on login.
+Set PASSWORD_HASH_WORKERS to 0 to hash inline (handy for tests and the
+shell).
+"""
+import atexit
+import multiprocessing
+import threading
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from passlib.context import CryptContext
+
+_contexts = {}
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+def _context(rounds):
+    # Built once per round count in each process, workers included
+    if rounds not in _contexts:
+        _contexts[rounds] = CryptContext(schemes=['pbkdf2_sha256'], pbkdf2_sha256__rounds=rounds)
+    return _contexts[rounds]
+
+def _hash(password, rounds):
+    return _context(rounds).hash(password)
+
+def _verify_and_update(password, password_hash, rounds):
+    return _context(rounds).verify_and_update(password, password_hash)
+
+def _shutdown():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+
+def _get_executor(workers, queue_size):
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            # Caps the jobs waiting on the pool so a login storm can't queue without bound
+            _slots = threading.BoundedSemaphore(workers + queue_size)
+            atexit.register(_shutdown)
+    return _executor
+
+def _run(fn, *args):
+    config = current_app.config
+    rounds = config['PASSWORD_HASH_ROUNDS']
+    workers = config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        return fn(*args, rounds)
+    executor = _get_executor(workers, config['PASSWORD_HASH_QUEUE_SIZE'])
+    with _slots:
+        return executor.submit(fn, *args, rounds).result()
+
+def hash_password(password):
+    """Hash a password with the configured parameters"""
+    return _run(_hash, password)
+
+def verify_and_update(password, password_hash):
+    """Verify a password. Returns (valid, new_hash); new_hash is set when the
+    stored hash uses outdated parameters and should be replaced."""
+    return _run(_verify_and_update, password, password_hash)
+
+def hash_passwords(passwords):
+    """Hash many passwords at once (e.g. for bulk imports), spread over the
+    whole pool instead of one job per password"""
+    config = current_app.config
+    rounds = config['PASSWORD_HASH_ROUNDS']
+    workers = config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        return [_hash(password, rounds) for password in passwords]
+    executor = _get_executor(workers, config['PASSWORD_HASH_QUEUE_SIZE'])
+    return list(executor.map(_hash, passwords, repeat(rounds), chunksize=64))
+
+def is_password_hash(value):
+    """Whether value is a hash this app can verify (any PBKDF2 round count)"""
+    return _context(current_app.config['PASSWORD_HASH_ROUNDS']).identify(value) is not None
@@ -0,0 +1,206 @@
+"""
+Asynchronous transaction posting
+
+With ASYNC_POSTING on, POST /transactions sent with `Prefer: respond-async`
+only validates the request and checks ownership. It then stores the
+transaction as 'pending', adds a posting_queue row and answers 202. Posting
+workers claim queued rows in micro-batches, leasing them for
+POSTING_LEASE_SECONDS. Each batch is grouped by account, and each group is
+posted in enqueue order in one database transaction, so a busy account's
+row lock is taken once per batch rather than once per request. A
+transaction ends up 'completed' or, if its balance change can't be
+applied (insufficient funds, account deleted), 'failed'. If a worker dies
+mid-group, its database transaction rolls back. When the lease runs out,
+another worker posts the rows.
+
+Workers run as POSTING_WORKERS threads in each app process, started on
+the first request, or as a separate process with `flask posting run`.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, update, delete, or_, func
+
+from app import db, cache
+from app.api import ledger
+from app.models import Transaction, PostingQueue
+
+def enqueue(transaction, account_id, user_id):
+    """Add a pending transaction and its queue entry to the session"""
+    transaction.status = 'pending'
+    db.session.add(transaction)
+    db.session.flush()
+    db.session.add(PostingQueue(transaction_id=transaction.id, account_id=account_id,
+                                user_id=user_id))
+
+def claim(limit, lease_seconds):
+    """Lease up to `limit` unleased (or expired) queue rows on a separate,
+    immediately committed connection. Returns the rows in enqueue order."""
+    now = datetime.utcnow()
+    available = or_(PostingQueue.leased_until.is_(None), PostingQueue.leased_until < now)
+    ids = (select(PostingQueue.id).where(available).order_by(PostingQueue.id).limit(limit)
+           .with_for_update(skip_locked=True))
+    # `available` is repeated so a row another worker leased in the meantime is skipped
+    stmt = (update(PostingQueue)
+            .where(PostingQueue.id.in_(ids), available)
+            .values(leased_until=now + timedelta(seconds=lease_seconds),
+                    attempts=PostingQueue.attempts + 1)
+            .returning(PostingQueue.id, PostingQueue.transaction_id, PostingQueue.account_id,
+                       PostingQueue.user_id, PostingQueue.attempts))
+    with db.engine.begin() as conn:
+        return sorted(conn.execute(stmt).all(), key=lambda row: row.id)
+
+def apply_transaction(transaction, owner_id):
+    """Apply a transaction's balance change; returns {account_id: owner} or None"""
+    if transaction.transaction_type == 'transfer':
+        return ledger.transfer(transaction.from_account_id, transaction.to_account_id,
+                               transaction.amount, owner_id=owner_id)
+    if transaction.transaction_type == 'deposit':
+        owner = ledger.credit(transaction.to_account_id, transaction.amount, owner_id=owner_id)
+        account_id = transaction.to_account_id
+    else:
+        owner = ledger.debit(transaction.from_account_id, transaction.amount, owner_id=owner_id)
+        account_id = transaction.from_account_id
+    return {account_id: owner} if owner is not None else None
+
+def post_group(entries, max_attempts):
+    """Post one account's claimed entries in a single database transaction"""
+    # Deleting the queue rows first also makes the DML that opens the
+    # transaction, so the savepoints below nest inside it on SQLite
+    db.session.execute(delete(PostingQueue).where(PostingQueue.id.in_([e.id for e in entries])))
+    transactions = {t.id: t for t in db.session.query(Transaction).filter(
+        Transaction.id.in_([e.transaction_id for e in entries]),
+        Transaction.status == 'pending'
+    ).with_for_update()}
+
+    posted_at = datetime.utcnow()
+    owners = {}
+    for entry in entries:
+        transaction = transactions.get(entry.transaction_id)
+        if transaction is None:
+            # Posted by a worker whose lease ran out, or deleted
+            continue
+        changed = None
+        if entry.attempts <= max_attempts:
+            savepoint = db.session.begin_nested()
+            changed = apply_transaction(transaction, entry.user_id)
+            if changed is None:
+                savepoint.rollback()
+            else:
+                savepoint.commit()
+        if changed is None:
+            transaction.status = 'failed'
+        else:
+            owners.update(changed)
+            # The ledger time of a queued transaction is when it was posted
+            transaction.status = 'completed'
+            transaction.timestamp = posted_at
+    db.session.flush()
+    ledger.record_snapshots(owners, posted_at.date())
+    db.session.commit()
+    cache.invalidate_accounts(owners)
+
+def post_batch(limit=None):
+    """Claim and post one micro-batch; returns the number of entries claimed"""
+    config = current_app.config
+    entries = claim(limit or config['POSTING_BATCH_SIZE'], config['POSTING_LEASE_SECONDS'])
+    key = lambda entry: entry.account_id
+    for account_id, group in groupby(sorted(entries, key=key), key=key):
+        group = list(group)
+        try:
+            post_group(group, config['POSTING_MAX_ATTEMPTS'])
+        except Exception:
+            # E.g. a deadlock with another worker; release the lease to retry soon
+            db.session.rollback()
+            current_app.logger.exception('Posting for account %s failed', account_id)
+            with db.engine.begin() as conn:
+                conn.execute(update(PostingQueue)
+                             .where(PostingQueue.id.in_([e.id for e in group]))
+                             .values(leased_until=None))
+    return len(entries)
+
+def run_worker(app, stop):
+    """Post batches until `stop` is set, sleeping while the queue is empty"""
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                claimed = post_batch()
+            except Exception:
+                app.logger.exception('Posting worker error')
+                claimed = 0
+            finally:
+                db.session.remove()
+            if not claimed:
+                stop.wait(app.config['POSTING_POLL_INTERVAL'])
+
+def start_workers(app, count):
+    stop = threading.Event()
+    threads = [threading.Thread(target=run_worker, args=(app, stop), daemon=True,
+                                name=f'posting-{i}') for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return stop, threads
+
+posting_cli = AppGroup('posting', help='Asynchronous transaction posting')
+
+@posting_cli.command('run')
+@click.option('--workers', default=2, show_default=True, help='Worker threads')
+def run_command(workers):
+    """Post queued transactions until interrupted"""
+    stop, threads = start_workers(current_app._get_current_object(), workers)
+    click.echo(f'Posting with {workers} workers, Ctrl+C to stop')
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+@posting_cli.command('status')
+def status_command():
+    """Show the queue depth and the age of the oldest entry"""
+    depth, oldest = db.session.query(func.count(PostingQueue.id),
+                                     func.min(PostingQueue.enqueued_at)).one()
+    age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+    click.echo(f'{depth} queued, oldest {age:.1f}s')
+
+class Posting:
+    """Flask extension running posting workers inside the app process"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASYNC_POSTING', False)
+        app.config.setdefault('POSTING_WORKERS', 2)
+        app.config.setdefault('POSTING_BATCH_SIZE', 200)
+        app.config.setdefault('POSTING_POLL_INTERVAL', 0.5)
+        app.config.setdefault('POSTING_LEASE_SECONDS', 60)
+        app.config.setdefault('POSTING_MAX_ATTEMPTS', 5)
+        app.extensions['posting'] = self
+        app.cli.add_command(posting_cli)
+        if app.config['ASYNC_POSTING'] and app.config['POSTING_WORKERS'] > 0:
+            # Started lazily so CLI commands (e.g. migrations) never run workers
+            app.before_request(self._ensure_workers)
+
+    def _ensure_workers(self):
+        # Each forked server process starts its own threads
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                app = current_app._get_current_object()
+                start_workers(app, app.config['POSTING_WORKERS'])
+                self._pid = os.getpid()
+
+posting = Posting()
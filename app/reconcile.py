@@ -0,0 +1,206 @@
+"""
+Ledger reconciliation
+
+    flask reconcile run [--workers N] [--shard-size N] [--full] [--output report.json]
+
+Checks every account's balance (hot accounts' shards included) against
+the sum of its completed transactions, archived ones included. Accounts are split into shards of
+--shard-size ids that a process pool of --workers processes checks in
+parallel (0 checks inline). Each shard is read in one snapshot, so the
+balances and the transactions it sees agree even while requests write.
+
+Runs are incremental: a LedgerWatermark row per account keeps the id of
+the last transaction summed and the ledger balance up to it, so a run
+only sums transactions added since the previous one. The watermark stops
+short of the shard's oldest pending transaction, which may still
+complete. --full ignores the watermarks and re-sums all history; run it
+now and then (and after bulk imports), because a transaction committed
+with an id below a watermark taken while it was in flight is otherwise
+never summed.
+
+Amounts are summed as integer cents (SCALE per currency unit) and
+balances converted with Decimal, so the comparison is exact; a
+difference of a cent or more is a mismatch. The report lists the
+mismatches and the throughput in accounts per second; the command exits
+with status 1 when there are any.
+"""
+import json
+import multiprocessing
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, ROUND_HALF_EVEN
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import create_engine, event, select, func, cast, case, BigInteger
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import NullPool
+
+from app import db
+from app.api.ledger import total_balance
+from app.archive import archive_horizon, combined_source
+from app.models import Account, Transaction, LedgerWatermark
+
+SCALE = 100
+
+_engines = {}
+
+def to_cents(value):
+    """Exact cents of a float balance, rounded half-even"""
+    return int((Decimal(value) * SCALE).quantize(Decimal(1), rounding=ROUND_HALF_EVEN))
+
+def format_cents(cents):
+    return str(Decimal(cents).scaleb(-2))
+
+def _engine(database_url):
+    # One engine per process; shards of a run share it
+    if database_url not in _engines:
+        engine = create_engine(database_url, poolclass=NullPool)
+        if engine.dialect.name == 'sqlite':
+            # pysqlite only opens a transaction before writes; BEGIN explicitly
+            # so all of a shard's reads see one snapshot
+            @event.listens_for(engine, 'connect')
+            def _connect(dbapi_connection, connection_record):
+                dbapi_connection.isolation_level = None
+
+            @event.listens_for(engine, 'begin')
+            def _begin(conn):
+                conn.exec_driver_sql('BEGIN')
+        else:
+            engine = engine.execution_options(isolation_level='REPEATABLE READ')
+        _engines[database_url] = engine
+    return _engines[database_url]
+
+def reconcile_shard(database_url, account_ids, full, archived):
+    """Check one shard in a single snapshot.
+
+    Returns (results, transactions summed) where results holds
+    (account_id, balance cents, ledger cents, through_id, settled cents):
+    the ledger balance of every completed transaction, and the new
+    watermark with the balance up to it.
+    """
+    source = combined_source() if archived else Transaction
+    cents = cast(func.round(source.amount * SCALE), BigInteger)
+    with _engine(database_url).begin() as conn:
+        balances = dict(conn.execute(
+            select(Account.id, total_balance()).where(Account.id.in_(account_ids))).all())
+        marks = {} if full else {
+            row.account_id: (row.through_id, row.balance_cents)
+            for row in conn.execute(select(LedgerWatermark).where(
+                LedgerWatermark.account_id.in_(account_ids)))
+        }
+        # The new watermark: the newest transaction, or just before the
+        # shard's oldest pending one
+        bound = conn.scalar(select(func.max(source.id))) or 0
+        for column in (source.from_account_id, source.to_account_id):
+            pending = conn.scalar(select(func.min(source.id)).where(
+                column.in_(account_ids), source.status == 'pending'))
+            if pending is not None:
+                bound = min(bound, pending - 1)
+
+        settled = {account_id: 0 for account_id in balances}
+        unsettled = dict(settled)
+        summed = 0
+        settles = case((source.id <= bound, True), else_=False)
+        for column, sign in ((source.to_account_id, 1), (source.from_account_id, -1)):
+            stmt = (select(column, settles, func.sum(cents), func.count())
+                    .where(column.in_(account_ids), source.status == 'completed')
+                    .group_by(column, settles))
+            if not full:
+                stmt = (stmt.outerjoin(LedgerWatermark, LedgerWatermark.account_id == column)
+                        .where(source.id > func.coalesce(LedgerWatermark.through_id, 0)))
+            for account_id, is_settled, total, count in conn.execute(stmt):
+                (settled if is_settled else unsettled)[account_id] += sign * int(total)
+                summed += count
+
+    results = []
+    for account_id, balance in balances.items():
+        through_id, start = marks.get(account_id, (0, 0))
+        # An account whose watermark is already past the bound keeps it
+        new_through_id = max(through_id, bound)
+        results.append((account_id, to_cents(balance or 0.0),
+                        start + settled[account_id] + unsettled[account_id],
+                        new_through_id, start + settled[account_id]))
+    return results, summed
+
+def save_watermarks(results):
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    stmt = insert(LedgerWatermark)
+    now = datetime.utcnow()
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['account_id'],
+        set_={'through_id': stmt.excluded.through_id,
+              'balance_cents': stmt.excluded.balance_cents,
+              'reconciled_at': stmt.excluded.reconciled_at}),
+        [{'account_id': account_id, 'through_id': through_id, 'balance_cents': settled,
+          'reconciled_at': now} for account_id, _, _, through_id, settled in results])
+    db.session.commit()
+
+def run_reconciliation(workers, shard_size, full):
+    """Reconcile every account; returns the report dict"""
+    database_url = db.engine.url.render_as_string(hide_password=False)
+    archived = archive_horizon() is not None
+    account_ids = db.session.scalars(select(Account.id).order_by(Account.id)).all()
+    db.session.commit()
+    shards = [account_ids[i:i + shard_size] for i in range(0, len(account_ids), shard_size)]
+
+    started = time.perf_counter()
+    mismatches, summed = [], 0
+    executor = None
+    if workers and len(shards) > 1:
+        executor = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context('spawn'))
+        outcomes = executor.map(reconcile_shard, [database_url] * len(shards), shards,
+                                [full] * len(shards), [archived] * len(shards))
+    else:
+        outcomes = (reconcile_shard(database_url, shard, full, archived) for shard in shards)
+    try:
+        for results, shard_summed in outcomes:
+            summed += shard_summed
+            # Watermarks are written here, so only this process writes
+            save_watermarks(results)
+            mismatches.extend(
+                {'account_id': account_id, 'balance': format_cents(balance),
+                 'ledger': format_cents(ledger), 'difference': format_cents(balance - ledger)}
+                for account_id, balance, ledger, _, _ in results if balance != ledger)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    elapsed = time.perf_counter() - started
+    return {
+        'accounts': len(account_ids),
+        'transactions_summed': summed,
+        'full': full,
+        'seconds': round(elapsed, 3),
+        'accounts_per_second': round(len(account_ids) / elapsed, 1) if elapsed else None,
+        'mismatches': mismatches,
+    }
+
+reconcile_cli = AppGroup('reconcile', help='Check account balances against the ledger')
+
+@reconcile_cli.command('run')
+@click.option('--workers', type=int, help='Processes checking shards (default: RECONCILE_WORKERS)')
+@click.option('--shard-size', type=int, help='Accounts per shard (default: RECONCILE_SHARD_SIZE)')
+@click.option('--full', is_flag=True, help='Re-sum all history instead of since the watermarks')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True),
+              help='Also write the report as JSON to this file')
+def run_command(workers, shard_size, full, output):
+    """Reconcile every account and report mismatches"""
+    config = current_app.config
+    report = run_reconciliation(
+        workers if workers is not None else config['RECONCILE_WORKERS'],
+        shard_size or config['RECONCILE_SHARD_SIZE'], full)
+    for mismatch in report['mismatches']:
+        click.echo(f'account {mismatch["account_id"]}: balance {mismatch["balance"]}, '
+                   f'ledger {mismatch["ledger"]} (difference {mismatch["difference"]})')
+    click.echo(f'{report["accounts"]} accounts, {report["transactions_summed"]} transactions '
+               f'summed in {report["seconds"]}s ({report["accounts_per_second"]} accounts/s); '
+               f'{len(report["mismatches"])} mismatches')
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if report['mismatches']:
+        raise SystemExit(1)
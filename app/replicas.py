@@ -0,0 +1,111 @@
+"""
+Read replica routing
+
+REPLICA_DATABASE_URIS lists read replicas of SQLALCHEMY_DATABASE_URI. They
+are registered as the binds replica_0, replica_1, ... and db.session is a
+RoutingSession: during GET/HEAD requests to the API blueprints every
+statement runs on one replica, picked round robin per request; everything
+else (writes, flushes, CLI commands, posting workers) uses the primary.
+
+A user who made a successful write reads from the primary for the next
+REPLICA_STICKY_SECONDS, so they see their own changes despite replication
+lag. The marker travels with the client: the write's response sets a
+cookie holding the user id, signed and timestamped with SECRET_KEY, which
+any worker can check without shared state. Values read from a replica are
+not put in the read-through cache: a lagging replica could otherwise
+refill an entry a write has just invalidated.
+"""
+import itertools
+
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+READ_METHODS = frozenset(('GET', 'HEAD'))
+STICKY_COOKIE = 'read_primary'
+
+def _sticky_serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='replica-sticky')
+
+def _request_user_id():
+    # Only known once the view's @jwt_required() has run
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+class RoutingSession(Session):
+    """Session sending reads of read-only requests to a replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing:
+            replica = replicas.engine_for_request()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def replica_bind_keys(config):
+    return [f'replica_{i}' for i in range(len(config['REPLICA_DATABASE_URIS']))]
+
+def reading_replica():
+    """Whether this request's reads have gone to a replica"""
+    return has_request_context() and g.get('replica_bind') is not None
+
+class Replicas:
+    """Flask extension registering the replica binds and read-your-writes stickiness"""
+
+    def __init__(self, app=None):
+        self._next = itertools.count()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Must run before db.init_app, which creates the bind engines"""
+        app.config.setdefault('REPLICA_DATABASE_URIS', [])
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+        bind_keys = replica_bind_keys(app.config)
+        if bind_keys:
+            binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+            binds.update(zip(bind_keys, app.config['REPLICA_DATABASE_URIS']))
+            app.config['SQLALCHEMY_BINDS'] = binds
+            app.after_request(self._mark_writer)
+        app.extensions['replicas'] = self
+
+    def engine_for_request(self):
+        """The replica engine serving this request, or None for the primary"""
+        if not has_request_context() or request.method not in READ_METHODS or request.blueprint is None:
+            return None
+        # Decided at the request's first statement, then kept so all its reads see one replica
+        if 'replica_bind' not in g:
+            g.replica_bind = self._choose()
+        if g.replica_bind is None:
+            return None
+        return current_app.extensions['sqlalchemy'].engines[g.replica_bind]
+
+    def _choose(self):
+        bind_keys = replica_bind_keys(current_app.config)
+        if not bind_keys:
+            return None
+        user_id = _request_user_id()
+        marker = request.cookies.get(STICKY_COOKIE)
+        if user_id is not None and marker:
+            try:
+                writer = _sticky_serializer().loads(
+                    marker, max_age=current_app.config['REPLICA_STICKY_SECONDS'])
+            except BadSignature:
+                writer = None
+            if writer == str(user_id):
+                return None
+        return bind_keys[next(self._next) % len(bind_keys)]
+
+    def _mark_writer(self, response):
+        if request.method not in READ_METHODS and response.status_code < 400:
+            user_id = _request_user_id()
+            if user_id is not None:
+                sticky_seconds = current_app.config['REPLICA_STICKY_SECONDS']
+                response.set_cookie(STICKY_COOKIE, _sticky_serializer().dumps(str(user_id)),
+                                    max_age=sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+replicas = Replicas()
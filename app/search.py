@@ -0,0 +1,58 @@
+"""
+Full-text search over transaction descriptions
+
+Each dialect keeps its own index, created by migrations:
+
+- SQLite: transaction_fts, an FTS5 table with external content (the
+  `transaction` table itself), kept in sync by triggers on insert, delete
+  and description updates.
+- Postgres: a GIN index on to_tsvector(SEARCH_CONFIG, description).
+
+Both tokenize with English stemming and match rows whose description
+contains every word of the query. Only the hot table is indexed. Searches
+reaching into archived months (see app/archive.py) still find archived
+rows without an index: Postgres evaluates the same tsvector match on
+them, and SQLite, whose FTS table only covers the hot table, falls back
+to a substring match on each word, which ignores case but not word
+endings.
+"""
+import re
+
+from sqlalchemy import select, func, table, column, literal_column, and_, or_
+
+from app import db
+from app.archive import archive_horizon
+from app.models import Transaction
+
+FTS_TABLE = 'transaction_fts'
+SEARCH_CONFIG = 'english'
+
+fts_table = table(FTS_TABLE, column('rowid'))
+
+def query_words(text):
+    """The words of a search query, without punctuation or operators"""
+    return re.findall(r'\w+', text or '')
+
+def description_matches(words, source=Transaction):
+    """Filter clause for transactions of source (the hot table, or hot and
+    archived rows from app.archive.transaction_source()) whose description
+    has every word"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Literals rather than bound parameters, so the expression is the
+        # indexed one and the planner can use the GIN index
+        config = literal_column(f"'{SEARCH_CONFIG}'")
+        document = func.to_tsvector(config, func.coalesce(source.description,
+                                                          literal_column("''")))
+        return document.op('@@')(func.plainto_tsquery(config, ' '.join(words)))
+    # Each word as a quoted phrase: FTS5 ANDs them and treats none as syntax
+    match = ' '.join(f'"{word}"' for word in words)
+    matching = select(fts_table.c.rowid).where(
+        literal_column(FTS_TABLE).op('MATCH')(match))
+    indexed = source.id.in_(matching)
+    if source is Transaction:
+        return indexed
+    # Archived rows left the FTS table with the hot one, so they are scanned
+    archived = and_(source.timestamp < archive_horizon(), *(
+        source.description.like(f"%{word.replace('_', '/_')}%", escape='/')
+        for word in words))
+    return or_(indexed, archived)
@@ -0,0 +1,72 @@
+"""
+Response serializers
+
+One serializer per model shape, compiled once at import time into a plain
+function that builds the response dict in a single expression. They work
+on column tuples from db.session.query(*SERIALIZER.columns), so list
+endpoints never hydrate ORM objects, and on model instances for the
+write paths that already have one.
+"""
+from sqlalchemy import Date, DateTime
+
+from app.models import User, Account, Transaction
+from app.api.ledger import total_balance, total_version
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+class RowSerializer:
+    """Serializes rows of the given model columns to dicts keyed by column name"""
+
+    def __init__(self, *columns):
+        self.columns = columns
+        self.keys = tuple(column.key for column in columns)
+        namespace = {'_isoformat': _isoformat}
+        # Only DateTime/Date columns need a conversion; everything else is copied as is
+        fields = ', '.join(
+            f'{key!r}: _isoformat(r[{i}])' if isinstance(column.type, (Date, DateTime))
+            else f'{key!r}: r[{i}]'
+            for i, (key, column) in enumerate(zip(self.keys, columns))
+        )
+        exec(f'def from_row(r): return {{{fields}}}', namespace)
+        self.from_row = namespace['from_row']
+        getter = ', '.join(f'o.{key}' for key in self.keys)
+        exec(f'def from_object(o): return from_row(({getter},))',
+             {'from_row': self.from_row}, namespace)
+        self.from_object = namespace['from_object']
+
+    def columns_for(self, entity):
+        """The columns as attributes of entity, e.g. an aliased model"""
+        return tuple(getattr(entity, key) for key in self.keys)
+
+    def many(self, rows):
+        from_row = self.from_row
+        return [from_row(row) for row in rows]
+
+TRANSACTION = RowSerializer(
+    Transaction.id,
+    Transaction.transaction_type,
+    Transaction.amount,
+    Transaction.from_account_id,
+    Transaction.to_account_id,
+    Transaction.timestamp,
+    Transaction.status,
+    Transaction.description,
+)
+
+# Balance and version include hot accounts' shards
+ACCOUNT = RowSerializer(
+    Account.id,
+    Account.account_number,
+    Account.account_type,
+    total_balance().label('balance'),
+    Account.created_at,
+    total_version().label('version'),
+)
+
+USER = RowSerializer(
+    User.id,
+    User.email,
+    User.name,
+    User.created_at,
+)
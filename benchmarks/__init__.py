@@ -0,0 +1,3 @@
+"""
+Benchmarks and performance checks
+"""
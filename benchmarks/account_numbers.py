@@ -0,0 +1,68 @@
+"""
+Open accounts in bulk from several processes.
+
+Each worker process runs its own app and opens --accounts accounts through
+POST /accounts, drawing numbers from its own reserved block. Reports
+throughput and checks that every number is unique and carries a valid
+check digit.
+
+    python -m benchmarks.account_numbers --workers 8 --accounts 500
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+from collections import Counter
+
+from app import db
+from app.models import User, Account
+from app.account_numbers import is_valid_account_number
+from benchmarks.common import temp_sqlite_url, make_app, migrate, auth_header
+
+def worker(args):
+    database_url, user_id, n_accounts, block_size = args
+    app = make_app(database_url, ACCOUNT_NUMBER_BLOCK_SIZE=block_size)
+    client = app.test_client()
+    headers = auth_header(app, user_id)
+    statuses = Counter()
+    for _ in range(n_accounts):
+        response = client.post('/accounts', headers=headers, json={'account_type': 'savings'})
+        statuses[response.status_code] += 1
+    return statuses
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--accounts', type=int, default=250, help='accounts per worker')
+    parser.add_argument('--block-size', type=int, default=100)
+    args = parser.parse_args()
+
+    database_url = args.database_url or temp_sqlite_url()
+    app = make_app(database_url)
+    migrate(app)
+    with app.app_context():
+        user = User(email='bulk@example.com', name='Bulk', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    jobs = [(database_url, user_id, args.accounts, args.block_size) for _ in range(args.workers)]
+    started = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(args.workers) as pool:
+        statuses = sum(pool.map(worker, jobs), Counter())
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        numbers = [n for (n,) in db.session.query(Account.account_number)]
+    total = args.workers * args.accounts
+    duplicates = len(numbers) - len(set(numbers))
+    invalid = sum(1 for n in numbers if not is_valid_account_number(n))
+
+    print(f'{total} accounts from {args.workers} processes in {elapsed:.2f}s '
+          f'({total / elapsed:.0f}/s), statuses {dict(statuses)}')
+    print(f'{len(numbers)} stored, {duplicates} duplicates, {invalid} invalid check digits')
+    return 0 if statuses[201] == total and not duplicates and not invalid else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
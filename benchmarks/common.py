@@ -0,0 +1,146 @@
+"""
+Helpers shared by the benchmark scripts
+"""
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
+from sqlalchemy import delete, select, func
+
+from config import Config
+from app import create_app, db
+from app.api.ledger import total_balance
+from app.models import (User, Account, Transaction, BalanceSnapshot, BalanceShard,
+                        LedgerWatermark, PostingQueue)
+from app.reconcile import run_reconciliation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def temp_sqlite_url(name='bench.db'):
+    """URL of a SQLite file in a fresh temporary directory"""
+    return 'sqlite:///' + os.path.join(tempfile.mkdtemp(), name)
+
+def make_app(database_url, **overrides):
+    """Create the app against database_url, with optional config overrides"""
+    attrs = {'SQLALCHEMY_DATABASE_URI': database_url}
+    if database_url.startswith('sqlite'):
+        # Let concurrent writers wait for the lock instead of failing immediately
+        attrs['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    attrs.update(overrides)
+    return create_app(type('BenchConfig', (Config,), attrs))
+
+def migrate(app):
+    """Bring the benchmark database up to the latest schema"""
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+
+def auth_header(app, user_id):
+    """Authorization header carrying a JWT for user_id"""
+    with app.app_context():
+        token = create_access_token(identity=str(user_id))
+    return {'Authorization': f'Bearer {token}'}
+
+def seed_ledger(app, opening_balances, balance_shards=None):
+    """Replace the database's contents with one user owning an account per
+    opening balance, each funded by an opening deposit. balance_shards maps
+    account positions to shard counts. Returns (user id, account ids)."""
+    with app.app_context():
+        # Start from a clean ledger so the conservation check is meaningful
+        for model in (BalanceShard, BalanceSnapshot, LedgerWatermark, PostingQueue,
+                      Transaction, Account, User):
+            db.session.execute(delete(model))
+        user = User(email='bench@example.com', name='Bench', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        accounts = [Account(account_number=f'{i:010d}', account_type='checking',
+                            balance=balance, user_id=user.id,
+                            balance_shards=(balance_shards or {}).get(i, 0))
+                    for i, balance in enumerate(opening_balances)]
+        db.session.add_all(accounts)
+        db.session.flush()
+        # Deposits rather than bare balances, so the transaction log accounts for them
+        db.session.add_all(Transaction(transaction_type='deposit', amount=balance,
+                                       to_account_id=account.id, description='Opening balance')
+                           for account, balance in zip(accounts, opening_balances) if balance)
+        db.session.commit()
+        return user.id, [account.id for account in accounts]
+
+def check_ledger(app, expected_total):
+    """Return a list of consistency problems (empty if the ledger is sound):
+    money created or lost, negative balances or shards, or balances that
+    don't match the transaction log"""
+    problems = []
+    with app.app_context():
+        balances = dict(db.session.execute(select(Account.id, total_balance())).all())
+        negative_shards = db.session.scalar(
+            select(func.count()).select_from(BalanceShard).where(BalanceShard.balance < 0))
+        report = run_reconciliation(0, 1000, True)
+    total = sum(balances.values())
+    if abs(total - expected_total) > 1e-6 * expected_total:
+        problems.append(f'total balance {total} != {expected_total}')
+    negative = [account_id for account_id, balance in balances.items() if balance < 0]
+    if negative or negative_shards:
+        problems.append(f'negative balances on accounts {negative}, {negative_shards} shards')
+    if report['mismatches']:
+        problems.append(f'balance does not match transaction log: {report["mismatches"]}')
+    return problems
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def http_request(port, method, path, body=None, headers=None, host='127.0.0.1'):
+    """Send one request to a server (local by default); returns (status, seconds, body bytes)"""
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    try:
+        started = time.perf_counter()
+        conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                     headers={'Content-Type': 'application/json', **(headers or {})})
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, time.perf_counter() - started, data
+    finally:
+        conn.close()
+
+def percentile(samples, pct):
+    """pct-th percentile of samples (nan if there are none)"""
+    if not samples:
+        return float('nan')
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100)[pct - 1]
+
+@contextmanager
+def gunicorn_server(database_url, command=('gunicorn', '-c', 'gunicorn.conf.py'), env=None,
+                    timeout=30):
+    """Run run:app under gunicorn against database_url; yields the port"""
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, PORT=str(port), **(env or {}))
+    process = subprocess.Popen(list(command) + ['--bind', f'127.0.0.1:{port}', 'run:app'],
+                               cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn exited during startup')
+            try:
+                http_request(port, 'GET', '/metrics')
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError('gunicorn did not start in time')
+                time.sleep(0.2)
+        yield port
+    finally:
+        process.terminate()
+        process.wait()
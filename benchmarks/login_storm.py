@@ -0,0 +1,79 @@
+"""
+Latency of cheap endpoints while a login storm is running.
+
+Serves the app from a threaded in-process server, hammers POST /users/login
+from --storm threads and meanwhile probes GET /accounts. Runs once with
+PBKDF2 computed inline on the request threads and once with the hashing
+process pool, and reports login throughput and probe latency for each.
+
+    python -m benchmarks.login_storm --seconds 10 --storm 16
+"""
+import argparse
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from app import db
+from app.models import User
+from benchmarks.common import temp_sqlite_url, make_app, migrate, auth_header, http_request, percentile
+
+def run(label, workers, rounds, seconds, storm):
+    app = make_app(temp_sqlite_url(), PASSWORD_HASH_WORKERS=workers, PASSWORD_HASH_ROUNDS=rounds)
+    migrate(app)
+    with app.app_context():
+        user = User(email='storm@example.com', name='Storm')
+        user.set_password('storm-password')
+        db.session.add(user)
+        db.session.commit()
+        headers = auth_header(app, user.id)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stop = threading.Event()
+    logins = []
+    probes = []
+
+    def login_loop():
+        while not stop.is_set():
+            status, _, _ = http_request(port, 'POST', '/users/login',
+                                {'email': 'storm@example.com', 'password': 'storm-password'})
+            logins.append(status)
+
+    def probe_loop():
+        while not stop.is_set():
+            _, elapsed, _ = http_request(port, 'GET', '/accounts', headers=headers)
+            probes.append(elapsed * 1000)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=login_loop) for _ in range(storm)]
+    threads.append(threading.Thread(target=probe_loop))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    print(f'{label:<24} logins {len(logins) / seconds:7.1f}/s   '
+          f'GET /accounts p50 {percentile(probes, 50):7.1f}ms  '
+          f'p95 {percentile(probes, 95):7.1f}ms  p99 {percentile(probes, 99):7.1f}ms')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--storm', type=int, default=16, help='concurrent login threads')
+    parser.add_argument('--rounds', type=int, default=29000)
+    parser.add_argument('--pool-workers', type=int, default=2)
+    args = parser.parse_args()
+
+    run('inline hashing', 0, args.rounds, args.seconds, args.storm)
+    run(f'pool ({args.pool_workers} processes)', args.pool_workers, args.rounds, args.seconds, args.storm)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
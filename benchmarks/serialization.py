@@ -0,0 +1,87 @@
+"""
+Microbenchmarks for transaction serialization.
+
+For 10k and 100k transactions, compares the old path (hydrate ORM objects,
+build each dict inline, encode with Flask's default JSON provider) with
+the new one (select column tuples, precompiled serializer, orjson
+provider). Reports fetch+serialize and encode times separately.
+
+    python -m benchmarks.serialization --sizes 10000 100000
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import insert
+
+from app import db
+from app.models import Transaction
+from app.json_provider import OrjsonProvider
+from app.serializers import TRANSACTION
+from benchmarks.common import make_app
+
+def seed(n_rows):
+    start = datetime.utcnow() - timedelta(days=30)
+    db.session.execute(insert(Transaction), [{
+        'transaction_type': 'transfer',
+        'amount': (i % 10000) / 100,
+        'from_account_id': 1,
+        'to_account_id': 2,
+        'timestamp': start + timedelta(seconds=i),
+        'status': 'completed',
+        'description': 'Transfer',
+    } for i in range(n_rows)])
+    db.session.commit()
+
+def old_path():
+    return [{
+        'id': t.id,
+        'transaction_type': t.transaction_type,
+        'amount': t.amount,
+        'from_account_id': t.from_account_id,
+        'to_account_id': t.to_account_id,
+        'timestamp': t.timestamp.isoformat(),
+        'status': t.status,
+        'description': t.description
+    } for t in Transaction.query.all()]
+
+def new_path():
+    return TRANSACTION.many(db.session.query(*TRANSACTION.columns))
+
+def best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        app = make_app('sqlite://')
+        with app.app_context():
+            db.create_all()
+            seed(size)
+            default_json, fast_json = DefaultJSONProvider(app), OrjsonProvider(app)
+            old_rows, old_data = best_of(old_path)
+            new_rows, new_data = best_of(new_path)
+            assert old_data == new_data
+            old_encode, _ = best_of(lambda: default_json.dumps(old_data))
+            new_encode, _ = best_of(lambda: fast_json.dumps(new_data))
+
+        print(f'{size:>7} transactions  '
+              f'fetch+serialize {old_rows * 1000:8.1f}ms -> {new_rows * 1000:8.1f}ms  '
+              f'encode {old_encode * 1000:8.1f}ms -> {new_encode * 1000:8.1f}ms  '
+              f'total {(old_rows + old_encode) / (new_rows + new_encode):.1f}x faster')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
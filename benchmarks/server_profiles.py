@@ -0,0 +1,98 @@
+"""
+Compare server profiles under a mixed read/write load.
+
+Starts gunicorn twice against the same database: the old bare setup (one
+sync worker, default engine options) and the production profile
+(gunicorn.conf.py with threaded workers, sized connection pool, SQLite
+WAL pragmas). Each runs --clients concurrent clients for --seconds that
+list accounts, page through transactions and post deposits. Throughput,
+latency percentiles and error counts are reported for each profile.
+
+    python -m benchmarks.server_profiles --seconds 15 --clients 32
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from app import db
+from app.models import User, Account
+from benchmarks.common import (temp_sqlite_url, make_app, migrate, auth_header,
+                               gunicorn_server, http_request, percentile)
+
+PROFILES = {
+    'bare (1 sync worker)': (['gunicorn', '--workers', '1'], {'APP_CONFIG': 'default'}),
+    'production profile': (['gunicorn', '-c', 'gunicorn.conf.py'], {'APP_CONFIG': 'production'}),
+}
+
+def seed(database_url):
+    app = make_app(database_url)
+    migrate(app)
+    with app.app_context():
+        user = User(email='profile@example.com', name='Profile', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        account = Account(account_number='00000000000', account_type='checking',
+                          balance=0.0, user_id=user.id)
+        db.session.add(account)
+        db.session.commit()
+        return auth_header(app, user.id), account.id
+
+def run_load(port, headers, account_id, seconds, clients):
+    calls = [
+        (6, 'GET', '/accounts', None),
+        (3, 'GET', '/transactions?limit=20', None),
+        (1, 'POST', '/transactions', {'transaction_type': 'deposit', 'amount': 1, 'account_id': account_id}),
+    ]
+    weights = [call[0] for call in calls]
+    stop = threading.Event()
+    latencies = []
+    statuses = Counter()
+
+    def client(seed_value):
+        rng = random.Random(seed_value)
+        while not stop.is_set():
+            _, method, path, body = rng.choices(calls, weights)[0]
+            try:
+                status, elapsed, _ = http_request(port, method, path, body, headers)
+            except OSError:
+                status, elapsed = 'connection error', 0
+            statuses[status] += 1
+            latencies.append(elapsed * 1000)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='WEB_CONCURRENCY for the production profile')
+    args = parser.parse_args()
+
+    database_url = args.database_url or temp_sqlite_url()
+    headers, account_id = seed(database_url)
+
+    for label, (command, env) in PROFILES.items():
+        if args.workers:
+            env = dict(env, WEB_CONCURRENCY=str(args.workers))
+        with gunicorn_server(database_url, command, env) as port:
+            latencies, statuses = run_load(port, headers, account_id, args.seconds, args.clients)
+        errors = sum(n for status, n in statuses.items() if status not in (200, 201))
+        print(f'{label:<22} {len(latencies) / args.seconds:8.1f} req/s  '
+              f'p50 {percentile(latencies, 50):7.1f}ms  p95 {percentile(latencies, 95):7.1f}ms  '
+              f'p99 {percentile(latencies, 99):7.1f}ms  errors {errors}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Benchmark GET /transactions/summary against client-side aggregation.
+
+Seeds a ledger of --rows transactions, then computes the same per-day/type
+totals and per-account flows two ways: by downloading every row through
+GET /transactions?stream=true and looping over it in Python (what the
+dashboards do today), and with the GROUP BY backed summary endpoint.
+
+    python -m benchmarks.transaction_summary --rows 1000000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import db
+from app.models import User, Account, Transaction
+from benchmarks.common import temp_sqlite_url, make_app, migrate, auth_header
+
+CHUNK = 50000
+
+def seed(app, n_rows, n_accounts):
+    rng = random.Random(7)
+    with app.app_context():
+        owner = User(email='owner@example.com', name='Owner', password_hash='x')
+        other = User(email='other@example.com', name='Other', password_hash='x')
+        db.session.add_all([owner, other])
+        db.session.flush()
+        mine = [Account(account_number=f'1{i:09d}', account_type='checking', user_id=owner.id)
+                for i in range(n_accounts)]
+        theirs = [Account(account_number=f'2{i:09d}', account_type='checking', user_id=other.id)
+                  for i in range(n_accounts)]
+        db.session.add_all(mine + theirs)
+        db.session.flush()
+        mine = [a.id for a in mine]
+        everyone = mine + [a.id for a in theirs]
+
+        start = datetime.utcnow() - timedelta(days=365)
+        for offset in range(0, n_rows, CHUNK):
+            rows = []
+            for i in range(offset, min(offset + CHUNK, n_rows)):
+                kind = rng.choice(('deposit', 'withdrawal', 'transfer'))
+                row = {
+                    'transaction_type': kind,
+                    'amount': rng.randint(1, 10000) / 100,
+                    'from_account_id': None,
+                    'to_account_id': None,
+                    'timestamp': start + timedelta(seconds=i * 31536000 // n_rows),
+                    'status': 'completed',
+                    'description': kind.title(),
+                }
+                if kind == 'deposit':
+                    row['to_account_id'] = rng.choice(mine)
+                elif kind == 'withdrawal':
+                    row['from_account_id'] = rng.choice(mine)
+                else:
+                    row['from_account_id'] = rng.choice(mine)
+                    row['to_account_id'] = rng.choice(everyone)
+                rows.append(row)
+            db.session.execute(insert(Transaction), rows)
+        db.session.commit()
+        return owner.id, set(mine)
+
+def client_side_summary(client, headers, owned):
+    """Aggregate the way the dashboards do: download everything, loop in Python"""
+    response = client.get('/transactions?stream=true', headers=headers)
+    by_day = defaultdict(lambda: [0, 0.0])
+    flows = defaultdict(lambda: [0.0, 0.0])
+    for t in json.loads(response.data):
+        entry = by_day[(t['timestamp'][:10], t['transaction_type'])]
+        entry[0] += 1
+        entry[1] += t['amount']
+        if t['to_account_id'] in owned:
+            flows[t['to_account_id']][0] += t['amount']
+        if t['from_account_id'] in owned:
+            flows[t['from_account_id']][1] += t['amount']
+    return len(by_day)
+
+def server_side_summary(client, headers):
+    response = client.get('/transactions/summary', headers=headers)
+    return len(response.get_json()['by_day'])
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--accounts', type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url or temp_sqlite_url())
+    migrate(app)
+    started = time.perf_counter()
+    user_id, owned = seed(app, args.rows, args.accounts)
+    print(f'seeded {args.rows} transactions in {time.perf_counter() - started:.1f}s')
+
+    client = app.test_client()
+    headers = auth_header(app, user_id)
+    per_row, groups_a = timed(client_side_summary, client, headers, owned)
+    grouped, groups_b = timed(server_side_summary, client, headers)
+    assert groups_a == groups_b, (groups_a, groups_b)
+
+    print(f'per-row download + Python loop: {per_row:8.2f}s')
+    print(f'GET /transactions/summary:      {grouped:8.2f}s  ({per_row / grouped:.0f}x faster)')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,83 @@
 import os
+import multiprocessing
 from datetime import timedelta
 
+# Gunicorn process/thread counts; gunicorn.conf.py reads these too, so the
+# connection pool below is always sized for the server that runs the app
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+
 class Config:
     SECRET_KEY = 'dev-secret-key-123'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///revobank.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = 'jwt-secret-key-123'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    # 'module:Class' of the Flask JSON provider; empty for Flask's default
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'app.json_provider:OrjsonProvider')
+    # PBKDF2 cost and the process pool that computes it (0 workers hashes inline)
+    PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS', 29000))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 64))
+    # Read-through cache for profiles and account lists ('module:Class' for a shared backend)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'app.cache:MemoryBackend')
+    CACHE_TTL = int(os.environ.get('CACHE_TTL', 30))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+    # Account number serials each process reserves per round trip
+    ACCOUNT_NUMBER_BLOCK_SIZE = int(os.environ.get('ACCOUNT_NUMBER_BLOCK_SIZE', 100))
+    # Requests running more SQL statements than this are logged as warnings;
+    # set METRICS_TOKEN to require it as a bearer token on /metrics
+    METRICS_QUERY_WARN_THRESHOLD = int(os.environ.get('METRICS_QUERY_WARN_THRESHOLD', 20))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Let clients opt into 202/pending posting with `Prefer: respond-async`;
+    # POSTING_WORKERS threads per process post the queue (0: only `flask posting run`)
+    ASYNC_POSTING = os.environ.get('ASYNC_POSTING', '').lower() in ('1', 'true', 'yes')
+    POSTING_WORKERS = int(os.environ.get('POSTING_WORKERS', 2))
+    POSTING_BATCH_SIZE = int(os.environ.get('POSTING_BATCH_SIZE', 200))
+    POSTING_POLL_INTERVAL = float(os.environ.get('POSTING_POLL_INTERVAL', 0.5))
+    POSTING_LEASE_SECONDS = int(os.environ.get('POSTING_LEASE_SECONDS', 60))
+    POSTING_MAX_ATTEMPTS = int(os.environ.get('POSTING_MAX_ATTEMPTS', 5))
+    # Months of transactions `flask archive run` keeps in the hot table
+    ARCHIVE_HOT_MONTHS = int(os.environ.get('ARCHIVE_HOT_MONTHS', 12))
+    # Comma-separated read replica URLs serving GET requests; users read from the
+    # primary for REPLICA_STICKY_SECONDS after a write
+    REPLICA_DATABASE_URIS = [url for url in os.environ.get('REPLICA_DATABASE_URLS', '').split(',') if url]
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+    # Processes and accounts per shard for `flask reconcile run`
+    RECONCILE_WORKERS = int(os.environ.get('RECONCILE_WORKERS', multiprocessing.cpu_count()))
+    RECONCILE_SHARD_SIZE = int(os.environ.get('RECONCILE_SHARD_SIZE', 1000))
+    # Stored responses for Idempotency-Key retries: kept for IDEMPOTENCY_TTL
+    # seconds; duplicates wait up to IDEMPOTENCY_WAIT_SECONDS for the first
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+    IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 10))
+    IDEMPOTENCY_POLL_INTERVAL = float(os.environ.get('IDEMPOTENCY_POLL_INTERVAL', 0.05))
+    IDEMPOTENCY_PURGE_INTERVAL = int(os.environ.get('IDEMPOTENCY_PURGE_INTERVAL', 60))
+
+class ProductionConfig(Config):
+    # Every worker process has its own pool and each of its threads holds at
+    # most one connection, so pool_size = threads. Overflow covers streamed
+    # responses that keep a connection past their thread's next request.
+    # Postgres must allow WEB_CONCURRENCY * 2 * GUNICORN_THREADS connections.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': GUNICORN_THREADS,
+        'max_overflow': GUNICORN_THREADS,
+        'pool_timeout': 10,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+    # Applied on every new connection when the database is SQLite
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+    }
+
+configs = {
+    'default': Config,
+    'production': ProductionConfig,
+}
+
+def get_config():
+    """Config class selected by the APP_CONFIG environment variable"""
+    return configs[os.environ.get('APP_CONFIG', 'default')]
@@ -0,0 +1,30 @@
+"""
+Gunicorn settings for the production profile
+
+    APP_CONFIG=production gunicorn -c gunicorn.conf.py run:app
+
+Threaded workers let one process overlap requests that wait on the
+database; set GUNICORN_WORKER_CLASS=gevent (and install gevent) to use
+green threads instead.
+"""
+import os
+
+from config import WEB_CONCURRENCY, GUNICORN_THREADS
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = WEB_CONCURRENCY
+threads = GUNICORN_THREADS
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+worker_connections = 1000
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't build up; the jitter
+# keeps them from all restarting at once
+max_requests = 5000
+max_requests_jitter = 500
+
+accesslog = '-'
+errorlog = '-'
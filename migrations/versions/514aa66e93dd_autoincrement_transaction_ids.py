@@ -0,0 +1,74 @@
+"""autoincrement transaction ids
+
+Revision ID: 514aa66e93dd
+Revises: d477ffdd5720
+Create Date: 2026-10-17 04:05:41.227310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '514aa66e93dd'
+down_revision = 'd477ffdd5720'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ('id, transaction_type, amount, from_account_id, to_account_id, '
+           'timestamp, status, description')
+
+
+def rebuild_transaction_table(autoincrement):
+    """Recreate the SQLite transaction table with or without AUTOINCREMENT.
+    The archive view and the full-text triggers name the table, so they are
+    dropped around the rebuild and recreated after it."""
+    conn = op.get_bind()
+    op.execute('DROP VIEW transaction_archive')
+    for trigger in ('insert', 'delete', 'update'):
+        op.execute(f'DROP TRIGGER transaction_fts_{trigger}')
+
+    with op.batch_alter_table('transaction', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+
+    if autoincrement:
+        # Archived rows keep their ids: start after the largest one ever used
+        partitions = [name for name in sa.inspect(conn).get_table_names()
+                      if name.startswith('transaction_archive_')]
+        largest = max([conn.execute(sa.text(f'SELECT max(id) FROM "{name}"')).scalar() or 0
+                       for name in partitions + ['transaction']])
+        op.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'transaction'"))
+        op.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('transaction', :seq)")
+                   .bindparams(seq=largest))
+
+    op.execute('CREATE TRIGGER transaction_fts_insert AFTER INSERT ON "transaction" BEGIN '
+               'INSERT INTO transaction_fts (rowid, description) '
+               'VALUES (new.id, new.description); END')
+    op.execute('CREATE TRIGGER transaction_fts_delete AFTER DELETE ON "transaction" BEGIN '
+               'INSERT INTO transaction_fts (transaction_fts, rowid, description) '
+               "VALUES ('delete', old.id, old.description); END")
+    op.execute('CREATE TRIGGER transaction_fts_update AFTER UPDATE OF description '
+               'ON "transaction" BEGIN '
+               'INSERT INTO transaction_fts (transaction_fts, rowid, description) '
+               "VALUES ('delete', old.id, old.description); "
+               'INSERT INTO transaction_fts (rowid, description) '
+               'VALUES (new.id, new.description); END')
+    partitions = sorted(name for name in sa.inspect(conn).get_table_names()
+                        if name.startswith('transaction_archive_'))
+    if partitions:
+        selects = ' UNION ALL '.join(f'SELECT {COLUMNS} FROM {name}' for name in partitions)
+    else:
+        selects = f'SELECT {COLUMNS} FROM "transaction" WHERE 0'
+    op.execute(f'CREATE VIEW transaction_archive AS {selects}')
+
+
+def upgrade():
+    # Postgres sequences never hand out an id twice already
+    if op.get_bind().dialect.name == 'sqlite':
+        rebuild_transaction_table(True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        rebuild_transaction_table(False)
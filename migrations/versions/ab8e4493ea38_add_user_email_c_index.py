@@ -0,0 +1,29 @@
+"""add user email C-collation index
+
+Revision ID: ab8e4493ea38
+Revises: 514aa66e93dd
+Create Date: 2026-10-17 04:31:09.655183
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ab8e4493ea38'
+down_revision = '514aa66e93dd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The email prefix search compares in "C" order on Postgres, which the
+    # unique index (in the database's collation) can't serve. SQLite's
+    # unique index already compares bytewise.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE INDEX ix_user_email_c ON "user" (email COLLATE "C")')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX ix_user_email_c')
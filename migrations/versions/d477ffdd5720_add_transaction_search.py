@@ -0,0 +1,50 @@
+"""add transaction search
+
+Revision ID: d477ffdd5720
+Revises: 70e54b3f1a54
+Create Date: 2026-10-17 03:42:18.902517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd477ffdd5720'
+down_revision = '70e54b3f1a54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Full-text indexes over transaction.description, used by app/search.py
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE INDEX ix_transaction_description_search ON "transaction" '
+                   "USING gin (to_tsvector('english', coalesce(description, '')))")
+    else:
+        op.execute("CREATE VIRTUAL TABLE transaction_fts USING fts5("
+                   "description, content='transaction', content_rowid='id', "
+                   "tokenize='porter unicode61')")
+        op.execute('CREATE TRIGGER transaction_fts_insert AFTER INSERT ON "transaction" BEGIN '
+                   'INSERT INTO transaction_fts (rowid, description) '
+                   'VALUES (new.id, new.description); END')
+        op.execute('CREATE TRIGGER transaction_fts_delete AFTER DELETE ON "transaction" BEGIN '
+                   'INSERT INTO transaction_fts (transaction_fts, rowid, description) '
+                   "VALUES ('delete', old.id, old.description); END")
+        op.execute('CREATE TRIGGER transaction_fts_update AFTER UPDATE OF description '
+                   'ON "transaction" BEGIN '
+                   'INSERT INTO transaction_fts (transaction_fts, rowid, description) '
+                   "VALUES ('delete', old.id, old.description); "
+                   'INSERT INTO transaction_fts (rowid, description) '
+                   'VALUES (new.id, new.description); END')
+        # Index the rows that are already there
+        op.execute("INSERT INTO transaction_fts (transaction_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX ix_transaction_description_search')
+    else:
+        for trigger in ('insert', 'delete', 'update'):
+            op.execute(f'DROP TRIGGER transaction_fts_{trigger}')
+        op.execute('DROP TABLE transaction_fts')
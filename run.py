@@ -1,7 +1,9 @@
+from flask_migrate import upgrade
+from config import get_config
 from app import create_app, db
 from app.models import User, Account, Transaction
 
-app = create_app()
+app = create_app(get_config())
 
 @app.shell_context_processor
 def make_shell_context():
@@ -14,5 +16,5 @@ def make_shell_context():
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        upgrade()
     app.run(host='0.0.0.0', port=5000)